@@ -2,14 +2,38 @@
 
 import sys
 import os
+import argparse
 
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'tankgame')))
 
 from tankgame.tankgame import TankGame
 
 def main():
+    parser = argparse.ArgumentParser(prog="tankgame")
+    parser.add_argument("--headless", action="store_true", help="Run the simulation without window, rendering or sound")
+    parser.add_argument("--map", default="lvl1", help="Map name in map_files (e.g. lvl12) or path to a map file (headless only)")
+    parser.add_argument("--ticks", type=int, default=10000, help="Number of simulation ticks to run (headless only)")
+    parser.add_argument("--tick-rate", type=int, default=100, help="Simulation ticks per second of game time")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the simulation RNG (reproducible runs)")
+    parser.add_argument("--ai-budget", type=int, default=16, help="Expensive AI tasks (retarget, path distance, hit scan) allowed per AI tick. A task count, not milliseconds")
+    args = parser.parse_args()
+
+    if args.headless:
+        game = TankGame(headless=True)
+        game.set_tick_rate(args.tick_rate)
+        game.seed = args.seed
+        game.ai_budget_tasks = args.ai_budget
+        ticks_per_second = game.run_headless(args.map, args.ticks)
+        alive = sum(not unit.dead for unit in game.units)
+        print(f"Map: {args.map}  Ticks: {args.ticks}  Ticks/s: {ticks_per_second:.1f}  Alive units: {alive}/{len(game.units)}")
+        print(f"AI work: {game.ai_scheduler.stats()}")
+        return
+
     game = TankGame()
+    game.set_tick_rate(args.tick_rate)
+    game.seed = args.seed
+    game.ai_budget_tasks = args.ai_budget
     game.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -75,7 +75,9 @@ class Mine:
             if self._is_in_radius(unit.pos):
                 unit.make_dead(True)
         
-        for obstacle in self.obstacles_des:
+        for obstacle in self.obstacles_des[:]:
+            if obstacle.aabb_distance_sq(self.pos) >= self.explode_radius**2:
+                continue  # Whole obstacle out of reach
             for corner_pair in obstacle.corners:
                 if self._is_in_radius(corner_pair):
                     self.obstacles_des.remove(obstacle)
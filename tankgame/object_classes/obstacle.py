@@ -1,15 +1,41 @@
+import numpy as np
 import utils.helper_functions as helper_functions
 
 class Obstacle:
-    _id_counter = 0 
+    _id_counter = 0
     def __init__(self, corners_list, obstacle_type):
         self.corners = corners_list
         self.obstacle_type = obstacle_type
-        
+
         # Obstacle id
         self.id = Obstacle._id_counter
         Obstacle._id_counter += 1
-        
+
+        # Geometry is static, so it is computed once here and read by all collision and ray code
+        self.corner_pairs = helper_functions.coord_to_coordlist(list(self.corners))
+        self.edges = np.array([(*start, *end) for start, end in self.corner_pairs], dtype=np.float64).reshape(-1, 4)   # (k, 4) rows of x1, y1, x2, y2
+
+        edge_vectors = self.edges[:, 2:4] - self.edges[:, 0:2]
+        self.edge_lengths = np.hypot(edge_vectors[:, 0], edge_vectors[:, 1])
+
+        # Outward unit normals. Shoelace area > 0 means (dy, -dx) points out of the polygon, otherwise (-dy, dx) does
+        signed_area = 0.5 * np.sum(self.edges[:, 0] * self.edges[:, 3] - self.edges[:, 2] * self.edges[:, 1])
+        winding = 1.0 if signed_area >= 0 else -1.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            normals = winding * np.stack((edge_vectors[:, 1], -edge_vectors[:, 0]), axis=1) / self.edge_lengths[:, None]
+        self.normals = np.nan_to_num(normals)     # Zero length edges get a zero normal
+
+        # Axis aligned bounding box (min_x, min_y, max_x, max_y) for cheap whole-obstacle rejection
+        corners = np.asarray(self.corners, dtype=np.float64).reshape(-1, 2)
+        self.aabb = (*corners.min(axis=0).tolist(), *corners.max(axis=0).tolist())
+
     def get_corner_pairs(self):
-        # Convert the polygon corners to pairs representing each line in the polygon
-        return helper_functions.coord_to_coordlist(self.corners)
\ No newline at end of file
+        # The polygon corners as pairs representing each line in the polygon
+        return self.corner_pairs
+
+    def aabb_distance_sq(self, point: tuple) -> float:
+        """Squared distance from a point to the bounding box (0 if inside)"""
+        min_x, min_y, max_x, max_y = self.aabb
+        dx = max(min_x - point[0], 0, point[0] - max_x)
+        dy = max(min_y - point[1], 0, point[1] - max_y)
+        return dx*dx + dy*dy
@@ -1,172 +1,363 @@
 
 import pygame as pg
-import utils.deflect as df
-import copy
+import numpy as np
 import random
-from utils import line_intersection
+import utils.batch_geometry as batch_geometry
+
+PROJECTILE_LIFESPAN = 5000  # Projectile lifespan
+SPAWN_TIMER = 10            # Amount of ticks that projectiles can't kill the unit it was fired from
+MAX_BOUNCES_PER_TICK = 4    # Bounces resolved within a single tick (the rest of the displacement is dropped)
+PROJECTILE_THICKNESS = 6
+
+
+def visual_scale(speed_original: float) -> float:
+    """Maps the projectile speed to 0-1, used for the color and the length of the projectile"""
+    t = (speed_original - 3.36) / (9.6 - 3.36)
+    return min(max(t, 0), 1)
+
+
+class ProjectilePool:
+    """Struct-of-arrays storage for all projectiles on the map. Slots are reused through a free list,
+    so shooting does not allocate new objects and all projectiles can be updated in one vectorized step.
+
+    Slot life cycle: spawn -> alive -> dead -> released at the end of the tick it died in
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = 0
+        self.free_slots: list[int] = []         # Stack of unused slot indices
+        self.views: list[Projectile] = []       # One cached view per slot
+
+        # Per slot data
+        self.pos = np.zeros((0, 2))
+        self.startpos = np.zeros((0, 2))
+        self.startpos_original = np.zeros((0, 2))   # quick fix to fix dodge problem with ai
+        self.spawn_coord = np.zeros((0, 2))
+        self.direction = np.zeros((0, 2))
+        self.speed_original = np.zeros(0)
+        self.speed = np.zeros(0)
+        self.path_scale = np.zeros(0)               # Length of the projectile line
+        self.lifespan = np.zeros(0)
+        self.spawn_timer = np.zeros(0, dtype=np.int32)
+        self.bounce_count = np.zeros(0, dtype=np.int32)
+        self.bounce_limit = np.zeros(0, dtype=np.int32)
+        self.owner = np.zeros(0, dtype=np.int64)    # The id from tank is was fired
+        self.alive = np.zeros(0, dtype=bool)
+        self.active = np.zeros(0, dtype=bool)       # Slot in use (alive, or died this tick and not released yet)
+
+        self.hit_sounds = []
+        self.projexp_sounds = []
+
+        # Path segments covered by the projectiles in the last update (slot, x1, y1, x2, y2)
+        self.swept_slots = np.zeros(0, dtype=np.int64)
+        self.swept_segments = np.zeros((0, 4))
+
+        self.grow(capacity)
+
+    def grow(self, new_capacity: int) -> None:
+        """Extends all arrays to new_capacity slots"""
+        extra = new_capacity - self.capacity
+        if extra <= 0:
+            return
+
+        for name in ("pos", "startpos", "startpos_original", "spawn_coord", "direction"):
+            setattr(self, name, np.concatenate((getattr(self, name), np.zeros((extra, 2)))))
+        for name in ("speed_original", "speed", "path_scale", "lifespan", "spawn_timer",
+                     "bounce_count", "bounce_limit", "owner", "alive", "active"):
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate((array, np.zeros(extra, dtype=array.dtype))))
+
+        self.views.extend(Projectile(self, i) for i in range(self.capacity, new_capacity))
+
+        # Lowest free index is popped first
+        self.free_slots = list(range(new_capacity - 1, self.capacity - 1, -1)) + self.free_slots
+        self.capacity = new_capacity
 
-class Projectile:
-    
-    def __init__(self, unit_pos: list, startpos: list, direction: tuple, speed: list[float], bounce_limit: int, id: int):   # Add color and more later!!!!
-        self.spawn_coord = list(tuple(unit_pos))
-        self.startpos = list(tuple(startpos))
-        self.startpos_original = list(tuple(startpos))  # quick fix to fix dodge problem with ai
-        self.pos = list(self.startpos)
-        self.direction = direction
-        self.degrees = 0
-        self.speed_original = speed
-        self.speed = speed  
-        self.alive = True  
-        self.lifespan = 5000     # Projectile lifespan
-        self.set_visuals()
-        
-        self.id = id    # The id from tank is was fired
-        self.bounce_count = 0
-        self.bounce_limit = bounce_limit
-        
-        self.spawn_timer = 10   # Amount of time that projectiles can't kill the unit it was fired from
-        self.hit_timer_amount = 0 # Frames. (0 right now which means maximum amount of collision checks)
-        self.hit_timer = 0
-
-    def set_visuals(self):
-        t = (self.speed_original - 3.36) / (9.6 - 3.36)
-        
-        if t > 1: 
-            t = 1
-        elif t < 0: 
-            t = 0
-        
-        self.color = (170 + 55*t, 170 - (100*t), 170 - (100*t)) 
-        
-        self.projectile_path_scale = 10 + 10 * t    # Scale of projectile len
-        self.thickness = 6
-    
-    def set_delta_time(self, delta_time):
-        self.delta_time = delta_time
-        self.update_speed()
-        
-    def update_speed(self):
-        self.speed = self.speed_original * self.delta_time * 60
-    
     def init_sound_effects(self, sound_effects):
-        self.sound_effects = sound_effects
-        
         self.hit_sounds = sound_effects["wallhit"]
-        self.projexp_sounds = self.sound_effects["proj_explosion"]
-    
-    def update(self):
+        self.projexp_sounds = sound_effects["proj_explosion"]
+
+    def spawn(self, unit_pos: list, startpos: list, direction: tuple, speed: float, bounce_limit: int, owner: int, delta_time: float) -> "Projectile":
+        """Takes a free slot and fills it with a new projectile"""
+        if not self.free_slots:
+            self.grow(self.capacity * 2)
+        i = self.free_slots.pop()
+
+        self.spawn_coord[i] = unit_pos
+        self.startpos[i] = startpos
+        self.startpos_original[i] = startpos
+        self.pos[i] = startpos
+        self.direction[i] = direction
+        self.speed_original[i] = speed
+        self.speed[i] = speed * delta_time * 60
+        self.path_scale[i] = 10 + 10 * visual_scale(speed)
+        self.lifespan[i] = PROJECTILE_LIFESPAN
+        self.spawn_timer[i] = SPAWN_TIMER
+        self.bounce_count[i] = 0
+        self.bounce_limit[i] = bounce_limit
+        self.owner[i] = owner
+        self.alive[i] = True
+        self.active[i] = True
+
+        return self.views[i]
+
+    def release_dead(self) -> np.ndarray:
+        """Frees the slots of projectiles that died this tick. Returns their positions (k, 2), where the explosions go"""
+        dead = np.flatnonzero(self.active & ~self.alive)
+        if len(dead) == 0:
+            return np.zeros((0, 2))
+        self.active[dead] = False
+        self.free_slots.extend(dead[::-1].tolist())
+        return self.pos[dead].copy()
+
+    def clear(self) -> None:
+        self.alive[:] = False
+        self.active[:] = False
+        self.free_slots = list(range(self.capacity - 1, -1, -1))
+
+    def active_views(self) -> list["Projectile"]:
+        return [self.views[i] for i in np.flatnonzero(self.active)]
+
+    def owned_views(self, owner: int) -> list["Projectile"]:
+        return [self.views[i] for i in np.flatnonzero(self.active & (self.owner == owner))]
+
+    def count_owned(self, owner: int) -> int:
+        return int(np.count_nonzero(self.active & (self.owner == owner)))
+
+    def update(self, delta_time: float, wall_index, types: tuple | None = None) -> None:
+        """Moves all alive projectiles along their full displacement for this tick, bouncing them on
+        the wall edges of the given obstacle types on the way (continuous collision), and kills the ones
+        that are spent. Only the edges in the wall index cells crossed by each projectile are tested"""
+        self.swept_slots = np.zeros(0, dtype=np.int64)
+        self.swept_segments = np.zeros((0, 4))
+
+        idx = np.flatnonzero(self.alive)
+        if len(idx) == 0:
+            return
+
         # Makes sure to detonate projetiles if spawntimer hasnt been depleted
-        if self.bounce_count > 0 and self.spawn_timer > 0:
-            self.alive = False
-            self.play_explosion()
-        
-        # Update projectile speed based on framerate
-        self.update_speed() 
-        
-        # Hit timer to control how often to do collision checks
-        if self.hit_timer > 0:
-            self.hit_timer -= self.delta_time * 60
-        
-        # Update position of projectile
-        self.pos[0] += self.direction[0]*self.speed
-        self.pos[1] += self.direction[1]*self.speed
-        
-        # Update spawn timer (UNUSED)
-        if self.spawn_timer > 0:
-            self.spawn_timer -= 1
-        
+        early = idx[(self.bounce_count[idx] > 0) & (self.spawn_timer[idx] > 0)]
+        self.alive[early] = False
+
+        # Newly fired projectiles are checked from tank.pos (this prevents projectiles spawing on other side of obstacle)
+        fresh = idx[self.spawn_timer[idx] == SPAWN_TIMER]
+        if len(fresh):
+            tips = self.pos[fresh] + self.direction[fresh] * self.path_scale[fresh, None]
+            edge_index, hit_points, hit_normals = wall_index.first_hits(self.spawn_coord[fresh], tips, types)
+            hits = np.flatnonzero(edge_index >= 0)
+            self._deflect(fresh[hits], hit_points[hits], hit_normals[hits])
+
+        # Update projectile speed based on framerate and move
+        self.speed[idx] = self.speed_original[idx] * delta_time * 60
+        self.sweep(idx[self.alive[idx]], wall_index, types)
+
+        self.spawn_timer[idx] = np.maximum(self.spawn_timer[idx] - 1, 0)
+
         # Update lifespan timer
-        self.lifespan -= self.delta_time * 60
-        if self.lifespan <= 0:
-            self.alive = False
-        
+        self.lifespan[idx] -= delta_time * 60
+        self.alive[idx[self.lifespan[idx] <= 0]] = False
+
         # Check if max bounces is reached
-        if self.bounce_count >= self.bounce_limit:
+        spent = idx[self.alive[idx] & (self.bounce_count[idx] >= self.bounce_limit[idx])]
+        self.alive[spent] = False
+
+        for _ in range(len(early) + len(spent)):
             self.play_explosion()
-            self.alive = False
-    
+
+    def sweep(self, idx: np.ndarray, wall_index, types: tuple | None = None) -> None:
+        """Moves the projectiles in idx by their speed. The tip of each projectile is swept along the
+        displacement, so walls are hit at the time of impact no matter how far it moves in one tick.
+        After a bounce the rest of the displacement continues in the new direction.
+
+        The segments covered this tick are stored in swept_slots/swept_segments for the unit hit check.
+        """
+        remaining = self.speed[idx].copy()
+        last_edge = np.full(len(idx), -1, dtype=np.int64)   # Edge bounced on in the previous pass
+        swept_slots = []
+        swept_segments = []
+
+        for _ in range(MAX_BOUNCES_PER_TICK + 1):
+            if len(idx) == 0:
+                break
+
+            scale = self.path_scale[idx]
+            starts = self.pos[idx]
+            directions = self.direction[idx]
+            ends = starts + directions * (remaining + scale)[:, None]
+
+            # Skip the edge just bounced on, so a projectile touching it is not deflected twice
+            edge_index, hit_points, normals = wall_index.first_hits(starts, ends, types, last_edge)
+            hit = edge_index >= 0
+
+            # Distance the projectile moves before its tip touches the wall
+            wall_dist = np.einsum("ij,ij->i", hit_points - starts, directions)
+            travel = np.where(hit, np.clip(wall_dist - scale, 0, remaining), remaining)
+
+            swept_slots.append(idx)
+            swept_segments.append(np.hstack((starts, starts + directions * (travel + scale)[:, None])))
+
+            self.pos[idx] = starts + directions * travel[:, None]
+            remaining -= travel
+
+            hits = np.flatnonzero(hit)
+            self._deflect(idx[hits], hit_points[hits], normals[hits])
+
+            # Continue with the rest of the displacement for the projectiles that can still bounce
+            keep = hits[self.bounce_count[idx[hits]] < self.bounce_limit[idx[hits]]]
+            keep = keep[remaining[keep] > 0]
+            idx, remaining, last_edge = idx[keep], remaining[keep], edge_index[keep]
+
+        self.swept_slots = np.concatenate(swept_slots) if swept_slots else np.zeros(0, dtype=np.int64)
+        self.swept_segments = np.vstack(swept_segments) if swept_segments else np.zeros((0, 4))
+
+    def _deflect(self, slots: np.ndarray, hit_points: np.ndarray, normals: np.ndarray) -> None:
+        """Bounces the projectiles in slots on walls with the given unit normals (facing the projectile)"""
+        if len(slots) == 0:
+            return
+        self.startpos[slots] = hit_points   # Update startpos for ai dodge mechanic
+        self.direction[slots] = batch_geometry.reflect(self.direction[slots], normals)
+        self.bounce_count[slots] += 1
+
+        for _ in slots:
+            random.choice(self.hit_sounds).play()   # Choose random sound
+
+    def find_unit_hits(self, hitbox_edges: np.ndarray, edge_owners: np.ndarray) -> list[tuple["Projectile", int]]:
+        """Checks the segments swept this tick against the unit hitboxes.
+
+        Args:
+            hitbox_edges (np.ndarray): (m, 4) hitbox edges of all alive units
+            edge_owners (np.ndarray): (m,) id of the unit each edge belongs to
+
+        Returns:
+            list[tuple[Projectile, int]]: the projectile and the id of the first unit on its path
+        """
+        if len(self.swept_slots) == 0 or len(hitbox_edges) == 0:
+            return []
+
+        slots = self.swept_slots
+        starts, ends = self.swept_segments[:, 0:2], self.swept_segments[:, 2:4]
+
+        # Skip unit if the projecile has been newly-fired from the same unit (prevents tank exploding itself)
+        mask = ~((self.spawn_timer[slots, None] > 0) & (self.owner[slots, None] == edge_owners[None, :]))
+        edge_index, hit_points, _ = batch_geometry.first_hits(starts, ends, hitbox_edges, mask)
+
+        hits = []
+        seen = set()
+        for row in np.flatnonzero(edge_index >= 0):    # Segments are in path order, so the first one per slot is the first hit
+            slot = int(slots[row])
+            if slot in seen:
+                continue
+            seen.add(slot)
+
+            # Place the projectile so its tip is at the impact point
+            direction = ends[row] - starts[row]
+            direction /= np.linalg.norm(direction)
+            self.pos[slot] = hit_points[row] - direction * self.path_scale[slot]
+
+            hits.append((self.views[slot], int(edge_owners[edge_index[row]])))
+        return hits
+
     def play_explosion(self):
-        # Play projectile explosion animation if active
         random.choice(self.projexp_sounds).play()
-        
+
+
+class Projectile:
+    """Lightweight view of one slot in the ProjectilePool. Views are cached per slot, so a view
+    is only valid while its projectile is active"""
+
+    __slots__ = ("pool", "index")
+
+    def __init__(self, pool: ProjectilePool, index: int):
+        self.pool = pool
+        self.index = index
+
+    @property
+    def pos(self) -> tuple:
+        return tuple(self.pool.pos[self.index].tolist())
+
+    @property
+    def startpos(self) -> tuple:
+        return tuple(self.pool.startpos[self.index].tolist())
+
+    @property
+    def startpos_original(self) -> tuple:
+        return tuple(self.pool.startpos_original[self.index].tolist())
+
+    @property
+    def spawn_coord(self) -> tuple:
+        return tuple(self.pool.spawn_coord[self.index].tolist())
+
+    @property
+    def direction(self) -> tuple:
+        return tuple(self.pool.direction[self.index].tolist())
+
+    @property
+    def speed(self) -> float:
+        return float(self.pool.speed[self.index])
+
+    @property
+    def speed_original(self) -> float:
+        return float(self.pool.speed_original[self.index])
+
+    @property
+    def projectile_path_scale(self) -> float:
+        return float(self.pool.path_scale[self.index])
+
+    @property
+    def bounce_count(self) -> int:
+        return int(self.pool.bounce_count[self.index])
+
+    @property
+    def bounce_limit(self) -> int:
+        return int(self.pool.bounce_limit[self.index])
+
+    @property
+    def spawn_timer(self) -> int:
+        return int(self.pool.spawn_timer[self.index])
+
+    @property
+    def id(self) -> int:
+        return int(self.pool.owner[self.index])
+
+    @property
+    def alive(self) -> bool:
+        return bool(self.pool.alive[self.index])
+
+    @alive.setter
+    def alive(self, state: bool):
+        self.pool.alive[self.index] = state
+
+    @property
+    def color(self) -> tuple:
+        t = visual_scale(self.speed_original)
+        return (170 + 55*t, 170 - (100*t), 170 - (100*t))
+
+    def set_alive(self, state: bool):
+        self.alive = state
+
+    def play_explosion(self):
+        self.pool.play_explosion()
+
     def get_pos(self):
         return self.pos
-    
+
     def get_dir(self):
         return self.direction
-    
+
+    def get_bounce_count(self):
+        return self.bounce_count
+
     def get_line(self):
-        return [(self.pos[0], self.pos[1]), (self.pos[0]+self.direction[0]*self.projectile_path_scale, self.pos[1]+self.direction[1]*self.projectile_path_scale)]
-        
+        x, y = self.pos
+        dx, dy = self.direction
+        scale = self.projectile_path_scale
+        return [(x, y), (x + dx*scale, y + dy*scale)]
+
     def draw(self, surface):
         if self.bounce_count < self.bounce_limit:
-            #pg.draw.circle(surface, "red", (int(self.pos[0]), int(self.pos[1])), 2)
             line_start, line_end = self.get_line()
-            pg.draw.line(surface, self.color, (line_start[0], line_start[1]), (line_end[0], line_end[1]), self.thickness)
-        
-        
-    def collision(self, line):
-        """line should be a tuple of 2 coords"""
-        if self.hit_timer > 0:
-            return
-        
-        # Coords of the "surface" line in the polygon
-        line_coord1, line_coord2 = line
-        
-        # If spawntimer is not done, projectile check would be done from tank.pos (this prevents projectiles spawing on other side of obstacle)
-        if self.spawn_timer > 0:
-            start_point = self.spawn_coord
-        else:
-            # Start of projectile path in a given frame
-            start_point = self.pos
-            
-        # End of projectile path in a given frame
-        end_point = (self.pos[0] + self.direction[0] * self.projectile_path_scale,
-                    self.pos[1] + self.direction[1] * self.projectile_path_scale)
-        
-        # Find coord where projectile and line meet
-        (x1, y1), (x2, y2) = line
-        (x3, y3), (x4, y4) = start_point, end_point
-        intersect_coord = line_intersection.line_intersection(x1, y1, x2, y2, x3, y3, x4, y4)
-        
-        # If there is no intersection then just keep diretion vector the same
-        if intersect_coord == (-1.0, -1.0):
-            return self.direction
-        
-        self.startpos = intersect_coord     # Update startpos for ai dodge mechanic
-        
-        # Find normal vector of line
-        normal_vector1, normal_vector2 = df.find_normal_vectors(line_coord1, line_coord2)
-        # print(f"Line start: {line_coord1}   End: {line_coord2}")
-        
-        # Find deflection vector and update the direction vector
-        
-        dot1 = normal_vector1[0]*self.direction[0] + normal_vector1[1]*self.direction[1]
-        dot2 = normal_vector2[0]*self.direction[0] + normal_vector2[1]*self.direction[1]
-
-        # The dot product should be negative if it is facing the projectile.   (Lige pt virker det ligemeget hvilken normalvector der vælges)
-        if dot1 < 0:
-            chosen_normal = normal_vector1
-        else:
-            chosen_normal = normal_vector2
-            
-        self.direction = df.find_deflect_vector(chosen_normal, self.direction)
-        random.choice(self.hit_sounds).play()   # Choose random sound
-        
-        self.bounce_count +=1
-        self.hit_timer = self.hit_timer_amount
-        
-    def add_bounce_count(self): 
-        self.bounce_count += 1
-    
-    def get_bounce_count(self):
-        return self.bounce_count
-    
-    def get_pos(self):
-        return self.pos
-    
-    def set_alive(self, state: bool):
-        self.alive = state
-    
+            pg.draw.line(surface, self.color, line_start, line_end, PROJECTILE_THICKNESS)
+
     def __repr__(self):
-        return f"Dir vector: ({float(self.pos[0]):.1f}, {float(self.pos[1]):.1f})"
\ No newline at end of file
+        x, y = self.pos
+        return f"Dir vector: ({x:.1f}, {y:.1f})"
@@ -1,19 +1,26 @@
 import pygame as pg
 import utils.deflect as df
-from object_classes.projectile import Projectile
+from object_classes.projectile import Projectile, ProjectilePool
 from object_classes.obstacle import Obstacle
 from object_classes.mine import Mine
 from object_classes.animation import Animation
 import utils.helper_functions as helper_functions
+from utils.spatial_index import EdgeGrid
+from utils.ray_service import RayService, AI_OBSTACLE_TYPES, LINE_OF_SIGHT_INTERVAL
+from utils.nav_context import NavContext
+from utils.nav_graph import NavGraph
+from utils.ai_scheduler import AIScheduler
+import utils.batch_geometry as batch_geometry
 import numpy as np
 import random
 import utils.pathfinding as pathfinding
-from scipy.spatial import KDTree
 import heapq
 import time
 import math
 from utils import line_intersection
 
+AI_TICK_RATE = 60           # AI updates per second of simulated time
+
 class Tank:
     _id_counter = 0 
     
@@ -26,6 +33,7 @@ class Tank:
                  bounch_limit: int, 
                  mine_limit: int,
                  global_mine_list: list[Mine],
+                 projectile_pool: ProjectilePool,
                  projectile_limit: int,
                  images: dict, 
                  use_turret,
@@ -36,7 +44,8 @@ class Tank:
                  draw_hitbox = True,
                  use_mag_reload_logic = False,
                  mag_size = 5,
-                 reload_time = 90
+                 reload_time = 90,
+                 mouse_aim = True
                  ):
         
         self.pos = list(startpos)
@@ -46,6 +55,7 @@ class Tank:
         self.speed = speed  # Used to control speed so it wont be fps bound
         self.speed_original = speed
         self.can_move = self.speed_original > 0
+        self.wall_push_speed = 0.0  # Replaces speed_original for the wall push out of tanks that can't move (set by the last tank push)
         
         self.is_moving = False  # True if moving: 1 = forward, -1 = backward
         self.is_moving_dir = 0
@@ -75,6 +85,7 @@ class Tank:
         self.firerate = firerate
         self.cannon_cooldown = 0
         self.projectile_limit = projectile_limit
+        self.projectile_pool = projectile_pool
         
         # Slowdown effect when shooting
         self.shot_slowness_cooldown_amount = 0
@@ -101,9 +112,6 @@ class Tank:
         self.mine_image = images["mine"]
         self.active_image = self.image
 
-        # Projectiles from current tank
-        self.projectiles: list[Projectile] = []
-        
         # Use turret?
         self.use_turret = use_turret
         self.turret_rotation_angle = self.degrees
@@ -139,13 +147,16 @@ class Tank:
         self.reload_timer = 0               # Countdown for reload
         self.reloading = False
         
+        # Player controlled turret follows the mouse (turned off in headless mode)
+        self.mouse_aim = mouse_aim
+        
         # Multiplayer
         self.mine_layed_counter = 0
         self.shot_fired_counter = 0
         self.aim_pos = (0,0)
         
-    def init_ai(self, obstacles: list[Obstacle], projectiles: list[Projectile], mines: list[Mine], all_ai_data_json: dict):
-        self.ai = TankAI(self, None, self.valid_nodes, self.units.copy(), obstacles, projectiles, mines, config=all_ai_data_json) if self.ai_type != "player" else None
+    def init_ai(self, obstacles: list[Obstacle], wall_index: EdgeGrid, projectiles: list[Projectile], mines: list[Mine], all_ai_data_json: dict, ray_service: RayService | None = None, scheduler: AIScheduler | None = None):
+        self.ai = TankAI(self, None, self.nav, self.units.copy(), obstacles, wall_index, projectiles, mines, config=all_ai_data_json, ray_service=ray_service, scheduler=scheduler) if self.ai_type != "player" else None
     
     def init_sound_effects(self, sound_effects):
         self.sound_effects = sound_effects
@@ -234,6 +245,8 @@ class Tank:
                 (tuple(p1 + offset), tuple(p2 + offset))
                 for p1, p2 in self.rotated_hitbox_lines[self.closest_angle]
             ]
+            # Same lines as a contiguous (4, 4) float64 buffer for the intersection kernel
+            self.hitbox_edges = np.array([(*p1, *p2) for p1, p2 in self.hitbox_lines], dtype=np.float64)
         except KeyError:
             pass
 
@@ -286,8 +299,8 @@ class Tank:
         self.make_dead(False)
 
         # TODO SKAL slette arg her og i tankgame
-    def update(self, delta_time):
-        """Update all tank logic and state"""
+    def update(self, delta_time, ai_steps: int = 1):
+        """Update all tank logic and state. ai_steps is the number of AI updates due this tick (from the simulation core)"""
         self.update_hitbox_position()
         self.time_alive += self.delta_time
         self.delta_time = delta_time
@@ -307,11 +320,10 @@ class Tank:
         # Stop units moving for 0.5 a second of spawn
         if self.time_alive < 0.5:
             self.speed = 0
-        else:
+        elif self.can_move:
             self.speed = self.speed_original * self.delta_time * 60  # 60 = target FPS
-        
-        # Remove dead projectiles
-        self.projectiles[:] = [p for p in self.projectiles if p.alive]
+        else:
+            self.speed = self.wall_push_speed * self.delta_time * 60
         
         # Handle dead state
         if self.dead:
@@ -320,7 +332,7 @@ class Tank:
         self.time_of_death = 0
         
         # Turret rotation for player controlled tanks
-        if self.ai is None:
+        if self.ai is None and self.mouse_aim:
             target_coord = pg.mouse.get_pos()
             self.turret_rotation_angle = helper_functions.find_angle(
                 self.pos[0], self.pos[1], 
@@ -340,10 +352,8 @@ class Tank:
             
         # AI updates
         if self.ai and not self.dead:
-            self.ai.update_accumulator += self.delta_time
-            while self.ai.update_accumulator >= self.ai.update_interval:
+            for _ in range(ai_steps):
                 self.ai.update()
-                self.ai.update_accumulator -= self.ai.update_interval
             
         # Pathfinding
         if self.go_to_waypoint:
@@ -383,24 +393,27 @@ class Tank:
         
     
           
-    def collision(self, line: tuple, collision_type: str) -> bool:
-        """Check if the tank collides with a given line based on collision_type."""
-        for start_point, end_point in self.hitbox_lines:
-            intersect_coord = self._check_line_intersection(line, (start_point, end_point))
-            
-            if intersect_coord != (-1.0, -1.0):
-                return self._handle_collision(collision_type, line)
+    def collide_with_walls(self, wall_index: EdgeGrid):
+        """Resolve surface collisions against the obstacle edges near the hitbox"""
+        xs = [p[0] for p in self.hitbox]
+        ys = [p[1] for p in self.hitbox]
+        for edge_id in wall_index.query_box_ids(min(xs), min(ys), max(xs), max(ys)):
+            self.collision(wall_index.edges[edge_id], collision_type="surface", normal=wall_index.edge_normals[edge_id])
+    
+    def collision(self, line: tuple, collision_type: str, normal: tuple | None = None) -> bool:
+        """Check if the tank collides with a given line based on collision_type. normal is the cached normal of the line if known"""
+        (x1, y1), (x2, y2) = line
         
-        return False
+        # All four hitbox lines are tested in one call
+        _, _, edge_index, _ = line_intersection.nearest_hit(x1, y1, x2, y2, self.hitbox_edges)
+        if edge_index >= 0:
+            return self._handle_collision(collision_type, line, normal)
         
-    def _check_line_intersection(self, line1, line2) -> tuple:
-        (x1, y1), (x2, y2) = line1
-        (x3, y3), (x4, y4) = line2
-        return line_intersection.line_intersection(x1, y1, x2, y2, x3, y3, x4, y4)
+        return False
 
-    def _handle_collision(self, collision_type: str, line: tuple) -> bool:
+    def _handle_collision(self, collision_type: str, line: tuple, normal: tuple | None = None) -> bool:
         if collision_type == "surface":
-            self._resolve_surface_collision(line)
+            self._resolve_surface_collision(line, normal)
             return True
         elif collision_type == "projectile":
             self.make_dead(True)
@@ -409,12 +422,17 @@ class Tank:
             print("Hitbox collision: type is unknown")
             return False
 
-    def _resolve_surface_collision(self, line: tuple):
-        normal_vector1, normal_vector2 = df.find_normal_vectors(*line)
+    def _resolve_surface_collision(self, line: tuple, normal: tuple | None = None):
+        if normal is None:
+            _, normal = df.find_normal_vectors(*line)
+        
+        # Push back along the normal on the tank's side of the line (also works inside the map border polygon)
+        start = line[0]
+        if normal[0] * (self.pos[0] - start[0]) + normal[1] * (self.pos[1] - start[1]) < 0:
+            normal = (-normal[0], -normal[1])
         magnitude = helper_functions.get_vector_magnitude(self.direction)
         
-        # Push back using normal_vector2
-        dx, dy = normal_vector2[0] * magnitude * self.speed, normal_vector2[1] * magnitude * self.speed
+        dx, dy = normal[0] * magnitude * self.speed, normal[1] * magnitude * self.speed
         
         self.pos[0] += dx
         self.pos[1] += dy
@@ -443,7 +461,7 @@ class Tank:
         # Dont shoot if dead, reach projectile limit or cooldown hasnt been reached
         if self.dead and not self.godmode:
             return
-        if len(self.projectiles) >= self.projectile_limit:
+        if self.projectile_pool.count_owned(self.id) >= self.projectile_limit:
             return
         if self.cannon_cooldown > 0:
             return
@@ -497,10 +515,8 @@ class Tank:
         # Find position for spawn of projectile
         spawn_projectile_pos = [self.pos[0] + unit_direction[0]*spawn_distance_from_middle, self.pos[1] + unit_direction[1]*spawn_distance_from_middle]
 
-        projectile = Projectile(self.pos, spawn_projectile_pos, projectile_direction, speed=self.speed_projectile, bounce_limit=self.bounch_limit, id=self.id)
-        projectile.init_sound_effects(self.sound_effects)
-        projectile.set_delta_time(self.delta_time)
-        self.projectiles.append(projectile)
+        self.projectile_pool.spawn(self.pos, spawn_projectile_pos, projectile_direction, speed=self.speed_projectile,
+                                   bounce_limit=self.bounch_limit, owner=self.id, delta_time=self.delta_time)
         
         # Play sound when firing
         random.choice(self.cannon_sounds).play()
@@ -533,10 +549,12 @@ class Tank:
             
             self.unit_mine_list.append(mine)
             self.global_mine_list.append(mine)
+            self.nav.mine_layer.add_mine(mine)
             
         
     def apply_repulsion(self, other_unit, push_strength=1.0):
-        """Pushes colliding tanks in correct direction with slight perpendicular push"""
+        """Pushes two colliding tanks apart in correct direction with slight perpendicular push. Call once per pair,
+        both tanks are moved by push_strength (in opposite directions)"""
         # Vector from other_unit to this tank
         dx = self.pos[0] - other_unit.pos[0]
         dy = self.pos[1] - other_unit.pos[1]
@@ -569,10 +587,15 @@ class Tank:
             direction_y * repulsion_distance + perp_y * perp_push_strength
         )
         
+        # Seen from the other tank both the direction and its left side are flipped
+        self.move_by_repulsion(repulsion_vector)
+        other_unit.move_by_repulsion((-repulsion_vector[0], -repulsion_vector[1]))
+    
+    def move_by_repulsion(self, repulsion_vector: tuple):
         # This is quick and dirty fix to prevent non moving tank being pushed through walls
         if not self.can_move:
-            self.speed = helper_functions.get_vector_magnitude(repulsion_vector)
-            self.speed_original = self.speed       
+            self.wall_push_speed = helper_functions.get_vector_magnitude(repulsion_vector)
+            self.speed = self.wall_push_speed
             # Scaling repulsion amount linearly with delta time
             dir_amount = -130 * self.delta_time + 3
             self.direction = (dir_amount, dir_amount)
@@ -591,6 +614,11 @@ class Tank:
     def __str__(self):
         return f"Pos: {self.pos} ai: {self.ai_type}"
 
+    @property
+    def projectiles(self) -> list[Projectile]:
+        """Projectiles from current tank (views into the shared pool)"""
+        return self.projectile_pool.owned_views(self.id)
+
     def get_projectile_list(self):
         return self.projectiles
     
@@ -620,24 +648,29 @@ class Tank:
         self.draw_hitbox = not self.draw_hitbox
 
     # ---------- Pathfinding ----------
-    def init_waypoint(self, grid_dict: dict, top_left: tuple, node_spacing: int, valid_nodes: list[tuple]):
+    def init_waypoint(self, nav_graph: NavGraph, top_left: tuple, node_spacing: int, nav: NavContext):
         # Functions makes sure to set up tank for at given path for pathfinding
         self.node_spacing = node_spacing
         self.top_left = top_left
-        self.grid_dict = grid_dict
-        self.valid_nodes = valid_nodes
+        self.nav_graph = nav_graph
+        self.nav = nav                      # Shared by all tanks on the map
+        self.valid_nodes = nav.node_list
     
-    def update_pathfinding(self, grid_dict: dict, valid_nodes):
-        self.grid_dict = grid_dict
-        self.valid_nodes = valid_nodes
+    def update_pathfinding(self, nav_graph: NavGraph, nav: NavContext):
+        self.nav_graph = nav_graph
+        self.nav = nav
+        self.valid_nodes = nav.node_list
         
-        self.ai.valid_nodes_original = self.valid_nodes.copy()
+        if getattr(self, "ai", None) is not None:
+            self.ai.set_nav(nav)
     
     def find_waypoint(self, destination_coord: tuple) -> None:
         """Starts a waypoint action. Unit will pathfind to the destination coordinate"""
         # Get path to the node
-        path = self.find_path(destination_coord)
-        
+        self.follow_path(self.find_path(destination_coord))
+    
+    def follow_path(self, path: list[tuple[int, int]] | None) -> None:
+        """Starts a waypoint action along a path of grid cells"""
         if path is None:
             # print("Could not find path")
             return
@@ -658,8 +691,9 @@ class Tank:
         tank_pos_grid = pathfinding.pygame_to_grid(self.pos, self.top_left, self.node_spacing)
         destination_coord_grid = pathfinding.pygame_to_grid(destination_coord, self.top_left, self.node_spacing)
         
-        # Find path
-        return pathfinding.find_path(self.grid_dict, tank_pos_grid, destination_coord_grid)
+        # Find path (cells inside mine radii are expensive, not blocked, so a tank standing on a mine can still leave)
+        return pathfinding.find_path(self.nav_graph, tank_pos_grid, destination_coord_grid, self.nav.mine_layer.cell_cost,
+                                    cost_version=self.nav.mine_layer.version)
     
     def move_to_node(self, node_coord: tuple[int, int]):
         """Controls the tank's movement toward the next node in the waypoint."""
@@ -749,34 +783,34 @@ class TankAI:
     def __init__(self, 
                  tank: Tank, 
                  personality, 
-                 valid_nodes: list[tuple], 
+                 nav: NavContext, 
                  units: list[Tank], 
                  obstacles: list[Obstacle], 
+                 wall_index: EdgeGrid,
                  projectiles: list[Projectile],
                  mines: list[Mine],
-                 config: dict):
-        
-        # FPS correction
-        self.update_accumulator = 0
-        self.update_interval = 1/60  # 60 updates per second
+                 config: dict,
+                 ray_service: RayService | None = None,
+                 scheduler: AIScheduler | None = None):
         
         # Generel tank information
         self.tank = tank                # The tank instance this AI controls
         self.spawn_coord = tank.pos     # Save the spawn coordinate
         self.personality = personality  # UNUSED
         
-        # Pathfinding nodes
-        self.valid_nodes_original = valid_nodes.copy()
-        self.valid_nodes = np.array(valid_nodes)  
-        self.kd_tree = KDTree(self.valid_nodes)  
+        # Pathfinding nodes (node array and KD-tree are shared by all tanks on the map)
+        self.set_nav(nav)
         self.possible_nodes = []
         
         # Import all data from map
         self.units = units              # All units
         self.units.remove(self.tank)    # Remove itself from the units list
         self.obstacles = obstacles      # All obstacles
+        self.wall_index = wall_index    # Edge grid used for the ray queries
         self.projectiles = projectiles  # All projectiles
         self.mines = mines              # All mines
+        self.ray_service = ray_service if ray_service is not None else RayService(wall_index)  # Batched rays of the tick (shared between AIs)
+        self.ray_cache = self.ray_service.ray_cache                                             # Traced turret rays
         
         # Tank that is under targeting
         self.potential_targets = [target for target in self.units if target.team != tank.team and not target.dead]
@@ -785,6 +819,13 @@ class TankAI:
         # Controls how often we do a update
         self.frame_counter = 0
         
+        # Budget and phase of the expensive periodic work (shared between AIs)
+        self.scheduler = scheduler if scheduler is not None else AIScheduler()
+        self.scheduler.register(self)
+        self.retarget_due = False
+        self.path_distance_due = False
+        self.hit_scan_due = False
+        
         # Starting state
         self.behavior_state = BehaviorStates.IDLE
         
@@ -835,6 +876,7 @@ class TankAI:
         self.rotation_mult_min = config.get("rotation_mult_min", 0.8)    # Minimum rotation multiplier when angledifference is 0 degress
         
         self.perfect_aim = config.get("perfect_aim", False)       # Removes random turret wandering
+        self.bank_shots = config.get("bank_shots", False)         # Aim at ricochet angles that hit the target when the direct shot is blocked
         self.turret_turn_threshold = 2  # Under this angle from target the turret stop moving
         
         self.advanced_targeting = config.get("advanced_targeting", True)  # Advanced targeting (True: line of fire check. False: Only distance check)
@@ -847,6 +889,9 @@ class TankAI:
         self.shoot_enemy_projectiles = config.get("shoot_enemy_projectiles", True)
         self.shoot_enemy_projectiles_range = config.get("shoot_enemy_projectiles_range", 100)   # The perpendicular distance to project path
         
+        # Projectile paths further away than this are ignored (nothing reacts to them)
+        self.threat_radius = max(self.dist_start_dodge, self.shoot_enemy_projectiles_range if self.shoot_enemy_projectiles else 0)
+        
         # Salvo
         self.salvo_cooldown_amount = config.get("salvo_cooldown_amount", 120) 
         self.salvo_cooldown = 0
@@ -861,6 +906,7 @@ class TankAI:
         self.current_target_angle = None  # Store the randomized target angle
         self.can_shoot = False
         self.debug_target_pos = (0,0)
+        self.bank_angle = None            # Ricochet angle the turret moves toward, None for direct aim
         
         # Mine
         self.mine_chance = config.get("mine_chance", 10000)
@@ -874,6 +920,7 @@ class TankAI:
         # Ray predict data
         self.update_rate = 1
         self.max_bounces = self.tank.bounch_limit - 1 # Temp remove one since 1 is added for projectile logic to work properly
+        self.turret_ray_angle = self.tank.turret_rotation_angle  # Turret angle at the start of the targeting step
         self.ray_path = [((0,0),(0,0)),((0,0),(0,0))]
         
         # Dodge ray
@@ -883,6 +930,10 @@ class TankAI:
         self.proj_ray = None
     
     
+    def set_nav(self, nav: NavContext):
+        self.nav = nav
+        self.valid_nodes = nav.nodes    # (n, 2) array view of the shared nodes, indexed by the KD-tree ids
+    
     def update_obstacles(self, obstacles):
         self.obstacles = obstacles
 
@@ -896,8 +947,15 @@ class TankAI:
         self.targeting()
         self.misc_updates()
         
-        if self.frame_counter % 120 == 0:
-            self.update_targeted_unit()
+        # Target reselection is due every 120 frames, but waits for AI budget
+        if self.scheduler.is_due(self, 120):
+            self.retarget_due = True
+        if self.retarget_due:
+            self.retarget_due = not self.scheduler.run("retarget", self.update_targeted_unit)
+        
+        # Retargeting finds no target once every enemy is dead
+        if self.targeted_unit is None:
+            return
         
         if self.movement == False:
             return
@@ -914,7 +972,7 @@ class TankAI:
             if self.frame_counter % update_freq == 0:
                 
                 try:
-                    self.tank.find_waypoint(self.targeted_unit.pos)
+                    self.pursue_target()
                 except:
                     pass
             return
@@ -998,6 +1056,9 @@ class TankAI:
         self.keep_distance_behavior()
         
     def attack(self):
+        if self.targeted_unit is None:
+            return
+        
         # Leave attack mode if target close
         if self.advanced_targeting:
             if self.target_in_sight or self.dist_to_target_direct < 100:
@@ -1011,7 +1072,8 @@ class TankAI:
                 return
 
         if self.tank.go_to_waypoint == False:
-            self.find_path_within_coord(self.targeted_unit.pos, 100)
+            if not self.pursue_target(stop_radius=100):
+                self.find_path_within_coord(self.targeted_unit.pos, 100)
             return
                
     def wander(self):
@@ -1080,7 +1142,7 @@ class TankAI:
                 dodge_nodes_pot.add(target)
 
         # Make sure only to use nodes that are valid on the map
-        dodge_nodes_valid = list(dodge_nodes_pot & set(self.valid_nodes_original))
+        dodge_nodes_valid = list(dodge_nodes_pot & self.nav.node_set)
         
         # Exit if no valid move
         if not dodge_nodes_valid:
@@ -1116,7 +1178,8 @@ class TankAI:
         
         # Predictive targeting projectiles
         # Check for the projectiles with closest distance not radial but path intersect with tank pos
-        if (self.shoot_enemy_projectiles == True and self.closest_projectile[0] != None and self.closest_projectile[1] < self.shoot_enemy_projectiles_range):
+        aim_at_projectile = (self.shoot_enemy_projectiles == True and self.closest_projectile[0] != None and self.closest_projectile[1] < self.shoot_enemy_projectiles_range)
+        if aim_at_projectile:
             target_pos = self.closest_projectile[0].pos
         else:
             # Predictive targeting unit
@@ -1130,8 +1193,18 @@ class TankAI:
         
         self.debug_target_pos = target_pos          
         
-        # Move turret
-        self.move_turret_to_target(target_pos, self.aiming_angle)
+        # Ricochet angle searched every 10 frames (the shot itself is still checked on the turret ray below)
+        if not self.bank_shots or aim_at_projectile:
+            self.bank_angle = None
+        elif self.frame_counter % 10 == 0:
+            self.bank_angle = self.find_bank_shot(target_pos)
+        
+        # Move turret (toward the ricochet angle if there is one)
+        if self.bank_angle is not None:
+            rads = math.radians(self.bank_angle)
+            self.move_turret_to_target((self.tank.pos[0] + math.cos(rads) * 100, self.tank.pos[1] + math.sin(rads) * 100), 0)
+        else:
+            self.move_turret_to_target(target_pos, self.aiming_angle)
         
         # If salvo cooldown has not been reached the unit wont shot
         if self.salvo_cooldown > 0:
@@ -1141,41 +1214,43 @@ class TankAI:
             self.ray_path = self.deflect_ray(self.max_bounces)
                 
         self.can_shoot = True
+        if not self.ray_path:
+            return
         
-        # First pass check for friendly fire and self harm
-        for line_segment in self.ray_path:
-            start, end = line_segment
-            
-            # 1. Dont shoot mines that are close enough to kill the unit
-            for mine in self.mines:
-                if (helper_functions.distance(mine.pos, self.tank.pos) < mine.explode_radius * 1.3
-                    and self.is_point_within_segment_and_threshold(start, end, mine.pos, self.safe_threshold)):
-                    self.can_shoot = False
-                    return
-            
-            # 2. Check self-collision first 
-            if self.can_shoot and self.is_point_within_segment_and_threshold(start, end, self.tank.pos, self.safe_threshold):
-                self.can_shoot = False
-                return
-                
-            # 3. Check for ally collisions (all units except target)
-            for unit in self.units:
-                if unit != self.targeted_unit and not unit.dead:
-                    if self.is_point_within_segment_and_threshold(start, end, unit.pos, self.safe_threshold):
-                        self.can_shoot = False
-                        return
-            
-        # Second pass check if valid target is in range
-        for line_segment in self.ray_path:
-            start, end = line_segment
-            # 3. Only shot target if it's safe to shoot
-            if self.can_shoot:
-                if (self.is_point_within_segment_and_threshold(start, end, target_pos, self.shoot_threshold) 
-                    and self.targeted_unit.team != self.tank.team 
-                    and not self.targeted_unit.dead):
-                    
-                    self.tank.shoot(None)
-                    return
+        # All ray segments against every point that matters in one call: mines close enough to kill the unit,
+        # the unit itself and all other units (friendly fire and self harm), and last the target
+        blockers = [mine.pos for mine in self.mines if helper_functions.distance(mine.pos, self.tank.pos) < mine.explode_radius * 1.3]
+        blockers.append(self.tank.pos)
+        blockers.extend(unit.pos for unit in self.units if unit != self.targeted_unit and not unit.dead)
+        
+        points = np.array(blockers + [target_pos], dtype=np.float64).reshape(-1, 2)
+        thresholds = np.full(len(points), float(self.safe_threshold))
+        thresholds[-1] = self.shoot_threshold
+        segments = np.array([(*start, *end) for start, end in self.ray_path], dtype=np.float64).reshape(-1, 4)
+        hits = batch_geometry.points_near_segments(segments, points, thresholds)
+        
+        # First check for friendly fire and self harm
+        if hits[:, :-1].any():
+            self.can_shoot = False
+            return
+        
+        # Only shot target if it's safe to shoot
+        if hits[:, -1].any():
+            self.tank.shoot(None)
+    
+    def find_bank_shot(self, target_pos: tuple) -> float | None:
+        """Firing angle closest to the turret whose path (with bounces) hits target_pos and none of the blockers
+        checked before shooting (close mines, the tank itself and the other units). None if there is no wall
+        between the tank and target_pos, the direct shot is taken then"""
+        _, _, edge_index, _ = self.wall_index.nearest_hit(float(self.tank.pos[0]), float(self.tank.pos[1]),
+                                                          float(target_pos[0]), float(target_pos[1]), AI_OBSTACLE_TYPES)
+        if edge_index < 0:
+            return None
+        blockers = [mine.pos for mine in self.mines if helper_functions.distance(mine.pos, self.tank.pos) < mine.explode_radius * 1.3]
+        blockers.append(self.tank.pos)
+        blockers.extend(unit.pos for unit in self.units if unit != self.targeted_unit and not unit.dead)
+        return self.ray_service.bank_shots.best_angle(self.tank.turret_rotation_angle, self.tank.pos, target_pos, blockers,
+                                                      self.max_bounces, self.shoot_threshold, self.safe_threshold)
     
     def update_targeted_unit(self):
         """Updates the targeted unit to the closest enemy unit, removing dead units"""
@@ -1191,45 +1266,11 @@ class TankAI:
         self.targeted_unit = min(
             self.potential_targets,
             key=lambda unit: (
-                not self.target_in_sight,  # False < True, so in-sight units come first
+                not self.nodes_visible(self.tank.pos, unit.pos),  # False < True, so in-sight units come first
                 helper_functions.distance(self.tank.pos, unit.pos)
             )
         )
                 
-    # ======================= Target filtering =====================
-    def is_point_within_segment_and_threshold(self, segment_start, segment_end, point, threshold):
-        """Check if point is between segment points and within shoot threshold"""
-        if not self.is_point_between_segment(segment_start, segment_end, point):
-            return False
-            
-        dist = helper_functions.point_to_line_distance(segment_start, segment_end, point)
-        return dist < threshold
-
-    def is_point_between_segment(self, segment_start, segment_end, point):
-        """Check if point lies between the start and end points of a segment"""
-        # Vector from segment start to end
-        segment_vec = (segment_end[0] - segment_start[0], segment_end[1] - segment_start[1])
-        
-        # Vector from segment start to point
-        point_vec = (point[0] - segment_start[0], point[1] - segment_start[1])
-        
-        # Dot product to check if point is in segment's "forward" direction
-        dot_product = (segment_vec[0] * point_vec[0] + segment_vec[1] * point_vec[1])
-        
-        # If dot product is negative, point is behind segment start
-        if dot_product < 0:
-            return False
-        
-        # Check if point is within segment length
-        segment_length_sq = (segment_vec[0]**2 + segment_vec[1]**2)
-        point_length_sq = (point_vec[0]**2 + point_vec[1]**2)
-        
-        # If point is further than segment length, it's beyond the segment
-        if point_length_sq > segment_length_sq:
-            return False
-        
-        return True
-        
     # ======================= Misc functions =======================
     
     def misc_updates(self):
@@ -1239,14 +1280,14 @@ class TankAI:
         if self.frame_counter % 10 == 0:
             self.dist_to_target_direct = helper_functions.distance(self.tank.pos, self.targeted_unit.pos)
   
-        # Path distance updated every 60 frames
-        if self.frame_counter % 60 == 0:
-            try:
-                self.dist_to_target_path = len(self.tank.find_path(self.targeted_unit.pos)) * self.tank.node_spacing 
-            except:
-                pass
-                # print("Tank blocked in")
-            self.hit_scan_check_proximity()  
+        # Path distance and hit scan are due every 60 frames, but wait for AI budget
+        if self.scheduler.is_due(self, LINE_OF_SIGHT_INTERVAL):
+            self.path_distance_due = True
+            self.hit_scan_due = True
+        if self.path_distance_due:
+            self.path_distance_due = not self.scheduler.run("path_distance", self.update_path_distance)
+        if self.hit_scan_due:
+            self.hit_scan_due = not self.scheduler.run("hit_scan", self.hit_scan_check_proximity)
         
         if self.timer > 0:
             self.timer -= 1  
@@ -1283,7 +1324,7 @@ class TankAI:
 
         
         # Cooldown after salvo
-        if len(self.tank.projectiles) == self.tank.projectile_limit:
+        if self.tank.projectile_pool.count_owned(self.tank.id) == self.tank.projectile_limit:
             self.salvo_cooldown = self.salvo_cooldown_amount
         
         if self.salvo_cooldown > 0:
@@ -1299,11 +1340,10 @@ class TankAI:
         if self.tank.go_to_waypoint:
             return  # If already moving, do nothing
 
-        # Build a KD-tree for fast nearest-neighbor search
-        kd_tree = KDTree(self.valid_nodes)
-        
-        # Query KD-tree for nodes within min_dist and max_dist from target
-        nearby_indices = kd_tree.query_ball_point(patrol_coord, patrol_radius)
+        # Query the shared KD-tree for nodes within the patrol radius
+        nearby_indices = self.nav.nodes_within(patrol_coord, patrol_radius)
+        if not nearby_indices:
+            return
         
         # Choose random node
         random_indice = random.choice(nearby_indices)
@@ -1319,6 +1359,7 @@ class TankAI:
                                 target_coord[1] - self.tank.pos[1])
         
         # Convert turret rotation angle to a direction vector
+        self.turret_ray_angle = self.tank.turret_rotation_angle
         rads = np.radians(self.tank.turret_rotation_angle)
         turret_direction = (np.cos(rads), np.sin(rads)) 
         
@@ -1364,14 +1405,12 @@ class TankAI:
         if self.tank.go_to_waypoint:
             return  # If already moving, do nothing
 
-        # Build a KD-tree for fast nearest-neighbor search
-        kd_tree = KDTree(self.valid_nodes)
-        
-        # Query KD-tree for nodes within min_dist and max_dist from target
+        # Query the shared KD-tree for nodes within max_dist from target
         target_pos = self.targeted_unit.pos
-        nearby_indices = kd_tree.query_ball_point(target_pos, self.max_dist_node)
+        nearby_indices = self.nav.nodes_within(target_pos, self.max_dist_node)
         
         possible_nodes = []
+        possible_ids = []
         for idx in nearby_indices:
             node = self.valid_nodes[idx]
             dist_node_target = helper_functions.distance(node, target_pos)
@@ -1379,6 +1418,15 @@ class TankAI:
 
             if self.min_dist_node < dist_node_target < self.max_dist_node:
                 possible_nodes.append((node, dist_node_target, dist_node_unit))
+                possible_ids.append(idx)
+        
+        # Prefer nodes with a clear shot at the target (node visibility is cached per map)
+        target_node = self.nav.nearest_node(target_pos)
+        if self.nav.visibility is not None and target_node >= 0 and possible_nodes:
+            visible = self.nav.visibility.visible_from(target_node)
+            in_sight = [choice for choice, idx in zip(possible_nodes, possible_ids) if visible[idx]]
+            if in_sight:
+                possible_nodes = in_sight
 
         # If there are valid choices, move to the best one. The node that is closest to the tanks current position
         # This prevents the tank chosing node behind the enemy.
@@ -1392,6 +1440,60 @@ class TankAI:
         
         self.possible_nodes = [x[0] for x in possible_nodes]
 
+    def nodes_visible(self, pos_a: tuple, pos_b: tuple) -> bool | None:
+        """Line of sight between the nodes closest to pos_a and pos_b, from the node visibility cached per map.
+        None if the map has no visibility table or no nodes"""
+        if self.nav.visibility is None:
+            return None
+        node_a, node_b = self.nav.nearest_node(pos_a), self.nav.nearest_node(pos_b)
+        if node_a < 0 or node_b < 0:
+            return None
+        return self.nav.visibility.visible(node_a, node_b)
+
+    def update_path_distance(self):
+        # Read from the flow field toward the target (shared with every AI chasing the same target)
+        field = self.target_flow_field()
+        if field is None:
+            return
+        
+        steps = field.steps_from(self.tank_node_id())
+        if steps >= 0:
+            self.dist_to_target_path = (steps + 1) * self.tank.node_spacing     # Nodes on the path, like len(path)
+        # else: tank blocked in
+    
+    def target_flow_field(self):
+        """Flow field toward the cell of the targeted unit, None if there is no target or it is off the grid"""
+        if self.targeted_unit is None or self.nav.flow_fields is None:
+            return None
+        target_cell = pathfinding.pygame_to_grid(self.targeted_unit.pos, self.tank.top_left, self.tank.node_spacing)
+        return self.nav.flow_fields.field(target_cell)
+    
+    def tank_node_id(self) -> int:
+        """Nav graph node id of the tank's grid cell (-1 if off the grid)"""
+        return self.tank.nav_graph.node_id(pathfinding.pygame_to_grid(self.tank.pos, self.tank.top_left, self.tank.node_spacing))
+    
+    def pursue_target(self, stop_radius: float = 0) -> bool:
+        """Follows the flow field toward the target, ending at the first node within stop_radius of it.
+        Returns False if the target can't be reached"""
+        field = self.target_flow_field()
+        if field is None:
+            return False
+        
+        path = field.path_from(self.tank_node_id())
+        if path is None:
+            return False
+        
+        if stop_radius > 0:
+            target_x, target_y = self.targeted_unit.pos
+            for index, cell in enumerate(path):
+                x, y = pathfinding.grid_to_pygame(cell, self.tank.top_left, self.tank.node_spacing)
+                if math.hypot(x - target_x, y - target_y) <= stop_radius:
+                    path = path[:index + 1]
+                    break
+        
+        self.tank.follow_path(path)
+        return True
+
     def find_closest_mine(self):
         if not self.mines:
             self.closest_mine = None
@@ -1405,40 +1507,30 @@ class TankAI:
         self.closest_mine = min(mines_data, key=lambda x: x[1])
 
     def find_random_path_without_mines(self):
-        # Find destination coord without mine (path without mines can't be done unless we recalculate the grid_dict, which is expensive)
-        # Update valid nodes to exclude dangerous nodes
-        temp_nodes = []
-        for node in self.valid_nodes:
-            if all(helper_functions.distance(node, mine.pos) > mine.explode_radius * 2 for mine in self.mines):
-                temp_nodes.append(node)
-        
-        if temp_nodes:
-            chosen_node = random.choice(temp_nodes)
+        # Find destination coord outside twice the radius of every mine (the path itself avoids mines through the A* mine cost)
+        safe_ids = self.nav.mine_layer.safe_node_ids(wide=True)
+        
+        if len(safe_ids):
+            chosen_node = self.valid_nodes[random.choice(safe_ids)]
             self.tank.find_waypoint(chosen_node)
         
     def avoid_mine(self):
         # Return if unit is not within mine explosion distance.
         # Also create list of all mines and there distance to unit
         
-        # Update valid nodes to exclude dangerous nodes
-        temp_nodes = []
-        for node in self.valid_nodes:
-            if all(helper_functions.distance(node, mine.pos) > mine.explode_radius for mine in self.mines):
-                temp_nodes.append(node)
-                
-        valid_nodes = np.array(temp_nodes)
-
-        # Build a KD-tree for fast nearest-neighbor search
-        kd_tree = KDTree(valid_nodes)
-        
-        # Query KD-tree for nodes within min_dist and max_dist from target
+        # Query the shared KD-tree for nodes within max_dist from the mine
         self.mine_avoid_max_dist = 400  # Could be moved to init if it should be different per unit
         target_pos = self.closest_mine[0].pos
-        nearby_indices = kd_tree.query_ball_point(target_pos, self.mine_avoid_max_dist)
+        nearby_indices = self.nav.nodes_within(target_pos, self.mine_avoid_max_dist)
         
         possible_nodes = []
         for idx in nearby_indices:
-            node = valid_nodes[idx]
+            node = self.valid_nodes[idx]
+            
+            # Exclude nodes inside the explosion radius of any mine
+            if self.nav.mine_layer.is_dangerous(idx):
+                continue
+            
             dist_node_target = helper_functions.distance(node, target_pos)
             dist_node_unit = helper_functions.distance(node, self.tank.pos)
             
@@ -1462,17 +1554,14 @@ class TankAI:
         # Check for intersections with obstacles
         coord1, coord2 = self.unit_target_line 
         
-        for obstacle in self.obstacles:
-            for corner_pair in obstacle.get_corner_pairs():
-                #result = df.line_intersection(map(float,coord1), map(float,coord2), corner_pair[0], corner_pair[1])
-                result = line_intersection.line_intersection(float(coord1[0]),float(coord1[1]), 
-                                                             float(coord2[0]),float(coord2[1]), 
-                                                             corner_pair[0][0], corner_pair[0][1],
-                                                             corner_pair[1][0], corner_pair[1][1])
-                
-                if result !=  (-1.0, -1.0):
-                    self.target_in_sight = False
-                    return False
+        # Use the batched check of this tick if the ray service prepared it
+        wall_free = self.ray_service.wall_free(self.tank.id, coord1, coord2)
+        if wall_free is None:
+            _, _, edge_index, _ = self.wall_index.nearest_hit(float(coord1[0]), float(coord1[1]), float(coord2[0]), float(coord2[1]), AI_OBSTACLE_TYPES)
+            wall_free = edge_index < 0
+        if not wall_free:
+            self.target_in_sight = False
+            return False
                 
         # Get turret's direction as a unit vector
         turret_direction_x = np.cos(np.radians(self.tank.turret_rotation_angle))
@@ -1509,96 +1598,48 @@ class TankAI:
         return True
     
     def find_closest_projectile_simpel(self):
-        """Finds the closest projectile path relativ to tank postion
+        """Finds the closest projectile path relativ to tank postion (only the current leg of each path)
         """
-        closest = None
-        min_dist = float("inf")
-        tank_pos = np.array(self.tank.pos)  # Cache tank position
-        
-        for proj in self.projectiles:
-            proj_pos = np.array(proj.pos)  # Cache projectile position
-            direction_vector = proj_pos - np.array(proj.startpos_original)
-            to_tank_vector = tank_pos - proj_pos
-
-            # Normalize vectors for accurate dot product
-            direction_vector_normalized = direction_vector / np.linalg.norm(direction_vector)
-            to_tank_normalized = to_tank_vector / np.linalg.norm(to_tank_vector)
-            
-            # Check if projectile is moving generally toward tank (allow some tolerance)
-            if np.dot(direction_vector_normalized, to_tank_normalized) < 0.3:  # 0.3 = ~72 degree tolerance
-                continue
-                
-            # Calculate distance
-            dist = helper_functions.point_to_line_distance(proj.startpos, proj.pos, self.tank.pos)
-            # Early update if better match found
-            if dist < min_dist:
-                min_dist = dist
-                closest = proj
-                # Early exit if perfect match found
-                if min_dist == 0:
-                    break
-
-        self.closest_projectile = (closest, min_dist if closest else 9999)
+        threat = self.ray_service.threat_field.nearest_threat(self.tank.pos, self.threat_radius, first_leg_only=True)
+        if threat is None:
+            self.closest_projectile = (None, 9999)
+            return
+        
+        slot, dist, _ = threat
+        self.closest_projectile = (self.tank.projectile_pool.views[slot], dist)
     
     def find_closest_projectile_advanced(self):
         """Finds the closest projectile path relativ to tank postion, ADVANDED: accounts for bounces!
         """
-        closest = None
-        min_dist = float("inf")
-        tank_pos = np.array(self.tank.pos)  # Cache tank position
-        
-        for proj in self.projectiles:
-            lines = self.deflect_ray_generel(proj.pos, proj.direction, proj.bounce_limit-proj.bounce_count-1)
-            self.proj_ray = lines
-            for start, end in lines:
-                start = np.array(start)
-                end = np.array(end)
-                
-                # Correct direction: from start to end
-                direction_vector = end - start
-                to_tank_vector = tank_pos - start
-                
-                # Normalize vectors
-                if np.linalg.norm(direction_vector) == 0 or np.linalg.norm(to_tank_vector) == 0:
-                    continue  # Avoid division by zero
-                direction_vector_normalized = direction_vector / np.linalg.norm(direction_vector)
-                to_tank_normalized = to_tank_vector / np.linalg.norm(to_tank_vector)
-                
-                # Check if projectile is moving generally toward tank
-                if np.dot(direction_vector_normalized, to_tank_normalized) < 0.3:  # 0.3 ≈ 72 degrees tolerance
-                    continue
-                
-                # Distance from tank to current line segment
-                dist = helper_functions.point_to_line_distance(start, end, tank_pos)
-                
-                # When a better projectile is found
-                if dist < min_dist:
-                    min_dist = dist
-                    closest = proj
-                    # Check for closest segment/line/path (in the ray path)
-                    first_segment_direction = end - start
-                    if np.linalg.norm(first_segment_direction) != 0:
-                        first_segment_direction = first_segment_direction / np.linalg.norm(first_segment_direction)
-                    predicted_direction = (first_segment_direction[0], first_segment_direction[1])
-                    
-                    if min_dist == 0:
-                        break
-
-        
-        self.closest_projectile = (closest, min_dist if closest else 9999, predicted_direction if closest else (0, 0))
-
-        # self.closest_projectile = (closest, min_dist if closest else 9999)
-        
-    # TODO Anvend generel func og slet:
-    def deflect_ray(self, bounces):        
+        # Paths are predicted once per projectile and bounce for all AIs by the threat field
+        threat = self.ray_service.threat_field.nearest_threat(self.tank.pos, self.threat_radius)
+        if threat is None:
+            self.closest_projectile = (None, 9999, (0, 0))
+            return
+        
+        slot, dist, predicted_direction = threat
+        closest = self.tank.projectile_pool.views[slot]
+        self.proj_ray = self.ray_service.projectile_path(closest)
+        self.closest_projectile = (closest, dist, predicted_direction)
+        
+    def deflect_ray(self, bounces):
+        """Turret ray path with bounces. Paths are memoized by quantized tank position and turret angle"""
+        key = self.ray_cache.key(self.tank.pos, self.turret_ray_angle, bounces, self.wall_index.version)
+        lines = self.ray_cache.get(key)
+        if lines is None:
+            lines = self.trace_turret_ray(self.ray_cache.quantized_origin(key), self.ray_cache.quantized_direction(key), bounces)
+            self.ray_cache.put(key, lines)
+        return lines
+    
+    def trace_turret_ray(self, origin, direction, bounces):
         lines = []
-        direction = self.turret_direction
         offset_start = 30
         
-        current_point = (self.tank.pos[0] + direction[0] * offset_start, 
-                         self.tank.pos[1] + direction[1] * offset_start)
+        current_point = (origin[0] + direction[0] * offset_start, 
+                         origin[1] + direction[1] * offset_start)
         bounce_count = 0
         max_distance = 2000
+        normals = self.wall_index.normal_array(types=AI_OBSTACLE_TYPES)
         
         while bounce_count <= bounces:
             # Calculate end point of this ray segment
@@ -1608,28 +1649,15 @@ class TankAI:
             )
             
             closest_intersection = None
-            closest_distance = float('inf')
             closest_normal = None
             
-            # Find closest intersection with any obstacle
-            for obstacle in self.obstacles:
-                for corner_pair in obstacle.get_corner_pairs():
-                    intersect = line_intersection.line_intersection(corner_pair[0][0], corner_pair[0][1],
-                                                     corner_pair[1][0], corner_pair[1][1], 
-                                                     current_point[0], current_point[1], 
-                                                     end_point[0], end_point[1])
-                    
-                    if intersect != (-1.0, -1.0):
-                        # Calculate distance and ensure we don't pick the same point
-                        dist = helper_functions.distance(current_point, intersect)
-                        if dist < closest_distance and dist > 1:  # Small threshold to avoid self-intersection
-                            closest_distance = dist
-                            closest_intersection = intersect
-                            # Get both possible normals using your function
-                            normal1, normal2 = df.find_normal_vectors(corner_pair[0], corner_pair[1])
-                            # Choose the normal facing the incoming ray using dot product
-                            dot1 = normal1[0]*direction[0] + normal1[1]*direction[1]
-                            closest_normal = normal1 if dot1 < 0 else normal2
+            # Find closest intersection with the obstacle edges along the ray (ignoring hits within 1 px to avoid self-intersection)
+            px, py, edge_index, _ = self.wall_index.nearest_hit(current_point[0], current_point[1], end_point[0], end_point[1], AI_OBSTACLE_TYPES, 1.0)
+            if edge_index >= 0:
+                closest_intersection = (px, py)
+                # Cached edge normal, flipped to face the incoming ray
+                nx, ny = normals[edge_index]
+                closest_normal = (nx, ny) if nx*direction[0] + ny*direction[1] < 0 else (-nx, -ny)
             
             # If no intersection found, draw the remaining ray and exit
             if not closest_intersection:
@@ -1654,71 +1682,6 @@ class TankAI:
         
         return lines
             
-    def deflect_ray_generel(self, start_point, direction, bounces, max_distance=2000):
-        lines = []
-        
-        # Start slightly offset in the direction
-        current_point = (
-            start_point[0] + direction[0], 
-            start_point[1] + direction[1]
-        )
-        bounce_count = 0
-        
-        while bounce_count <= bounces:
-            # Calculate end point of the current ray segment
-            end_point = (
-                current_point[0] + direction[0] * max_distance,
-                current_point[1] + direction[1] * max_distance
-            )
-            
-            closest_intersection = None
-            closest_distance = float('inf')
-            closest_normal = None
-            
-            # Find closest intersection with any obstacle
-            for obstacle in self.obstacles:
-                for corner_start, corner_end in obstacle.get_corner_pairs():
-                    intersect = line_intersection.line_intersection(
-                        corner_start[0], corner_start[1],
-                        corner_end[0], corner_end[1],
-                        current_point[0], current_point[1],
-                        end_point[0], end_point[1]
-                    )
-                    
-                    if intersect != (-1.0, -1.0):
-                        dist = helper_functions.distance(current_point, intersect)
-                        if dist < closest_distance and dist > 1:  # Avoid self-intersection
-                            closest_distance = dist
-                            closest_intersection = intersect
-                            # Get possible normals
-                            normal1, normal2 = df.find_normal_vectors(corner_start, corner_end)
-                            # Choose the correct normal based on incoming direction
-                            dot1 = normal1[0]*direction[0] + normal1[1]*direction[1]
-                            closest_normal = normal1 if dot1 < 0 else normal2
-            
-            # If no intersection found, ray goes infinitely
-            if not closest_intersection:
-                lines.append((tuple(current_point), tuple(end_point)))
-                break
-            
-            # Add current segment
-            lines.append((tuple(current_point), tuple(closest_intersection)))
-            
-            # Reflect direction based on the surface normal
-            if closest_normal:
-                direction = df.find_deflect_vector(closest_normal, direction)
-                # Slightly move the point along the new direction
-                current_point = (
-                    closest_intersection[0] + direction[0] * 0.1,
-                    closest_intersection[1] + direction[1] * 0.1
-                )
-            else:
-                current_point = closest_intersection
-            
-            bounce_count += 1
-        
-        return lines
-     
     def intercept_point(self, target_object, projectile = False):
         """Finds predictive coord for the unit and some target (other unit or projectile)"""
         # Calculate relative vector from shooter to target
@@ -0,0 +1,112 @@
+import argparse
+import glob
+import heapq
+import math
+import os
+import random
+import re
+import time
+import utils.helper_functions as helper_functions
+import utils.pathfinding as pathfinding
+
+MAP_DIR = os.path.join(os.path.dirname(__file__), "map_files")
+
+# Compares pathfinding.find_path with the previous A* (tuple keyed neighbour dict, dicts per search,
+# Euclidean heuristic) on random start/goal pairs of every lvl*.txt map. Both must find equally cheap paths.
+#   python tankgame/path_benchmark.py --queries 500 --seed 1
+
+
+def reference_find_path(grid_dict: dict, start_coord: tuple[int, int], end_coord: tuple[int, int]):
+    """The A* find_path used before the node id engine"""
+    open_list = [(0, start_coord)]
+    g_cost = {start_coord: 0}
+    came_from = {}
+    closed_list = set()
+
+    while open_list:
+        _, current = heapq.heappop(open_list)
+
+        if current == end_coord:
+            path = []
+            while current in came_from:
+                path.append(current)
+                current = came_from[current]
+            path.append(start_coord)
+            return path[::-1]
+
+        closed_list.add(current)
+
+        current_g = g_cost[current]
+        for neighbor, cost in grid_dict.get(current, []):
+            if neighbor in closed_list:
+                continue
+
+            new_g = current_g + cost
+            if neighbor not in g_cost or new_g < g_cost[neighbor]:
+                g_cost[neighbor] = new_g
+                f_cost = new_g + math.hypot(neighbor[0] - end_coord[0], neighbor[1] - end_coord[1])
+                heapq.heappush(open_list, (f_cost, neighbor))
+                came_from[neighbor] = current
+
+    return None
+
+def path_cost(path: list[tuple[int, int]] | None) -> float | None:
+    if path is None:
+        return None
+    return sum(1.4 if a[0] != b[0] and a[1] != b[1] else 1 for a, b in zip(path, path[1:]))
+
+def benchmark_map(map_path: str, queries: int, rng: random.Random) -> tuple[float, float, int]:
+    """(reference seconds, find_path seconds, mismatches) over the queries of one map"""
+    polygons, _, _, node_spacing = helper_functions.load_map_data(map_path)
+    border = polygons.pop(0)
+    map_grid, _ = pathfinding.find_valid_nodes(border, node_spacing, polygons)
+    graph = pathfinding.grid_to_graph(map_grid)
+    grid_dict = {graph.cell(node_id): graph.neighbors(node_id) for node_id in range(len(graph))}
+
+    free_cells = [graph.cell(node_id) for node_id in range(len(graph)) if not graph.blocked.flat[node_id]]
+    pairs = [(rng.choice(free_cells), rng.choice(free_cells)) for _ in range(queries)]
+
+    start = time.perf_counter()
+    reference_paths = [reference_find_path(grid_dict, a, b) for a, b in pairs]
+    reference_time = time.perf_counter() - start
+
+    # The path cache is emptied before each query, so only the search is timed
+    paths = []
+    new_time = 0.0
+    for a, b in pairs:
+        graph.path_cache.invalidate()
+        start = time.perf_counter()
+        paths.append(pathfinding.find_path(graph, a, b))
+        new_time += time.perf_counter() - start
+
+    mismatches = 0
+    for reference_path, path in zip(reference_paths, paths):
+        reference_cost, cost = path_cost(reference_path), path_cost(path)
+        if (reference_cost is None) != (cost is None) or (cost is not None and abs(reference_cost - cost) > 1e-6):
+            mismatches += 1
+    return reference_time, new_time, mismatches
+
+def main():
+    parser = argparse.ArgumentParser(prog="path_benchmark")
+    parser.add_argument("--queries", type=int, default=200, help="Random start/goal pairs per map")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the start/goal pairs")
+    args = parser.parse_args()
+
+    map_paths = sorted(glob.glob(os.path.join(MAP_DIR, "lvl*.txt")), key=lambda path: int(re.sub(r"\D", "", os.path.basename(path)) or 0))
+    rng = random.Random(args.seed)
+
+    total_reference = total_new = 0.0
+    total_mismatches = 0
+    for map_path in map_paths:
+        reference_time, new_time, mismatches = benchmark_map(map_path, args.queries, rng)
+        total_reference += reference_time
+        total_new += new_time
+        total_mismatches += mismatches
+        print(f"{os.path.basename(map_path):>10}  reference {reference_time * 1000:8.1f} ms  find_path {new_time * 1000:8.1f} ms  "
+              f"speedup {reference_time / max(new_time, 1e-9):5.2f}x  cost mismatches {mismatches}")
+
+    print(f"{'All maps':>10}  reference {total_reference * 1000:8.1f} ms  find_path {total_new * 1000:8.1f} ms  "
+          f"speedup {total_reference / max(total_new, 1e-9):5.2f}x  cost mismatches {total_mismatches}")
+
+if __name__ == "__main__":
+    main()
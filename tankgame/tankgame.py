@@ -5,7 +5,6 @@ import numpy as np
 import os
 import time
 import json
-from scipy.spatial import KDTree
 import random
 import re
 import ctypes
@@ -13,8 +12,8 @@ import cProfile
 import math
 
 from object_classes.textfield import Textfield
-from object_classes.projectile import Projectile
-from object_classes.tank import Tank
+from object_classes.projectile import Projectile, ProjectilePool
+from object_classes.tank import Tank, AI_TICK_RATE
 from object_classes.obstacle import Obstacle
 from object_classes.button import Button 
 from object_classes.mine import Mine 
@@ -22,15 +21,37 @@ from object_classes.track import Track
 from object_classes.animation import Animation
 import utils.pathfinding as pathfinding
 import utils.helper_functions as helper_functions
+from utils.spatial_index import EdgeGrid, SpatialHash
+from utils.ray_service import RayService, AI_OBSTACLE_TYPES
+from utils.nav_context import NavContext
+from utils.nav_visibility import NodeVisibility
+from utils.flow_field import FlowFieldService
+from utils.ai_scheduler import AIScheduler
 import tankgame.utils.networking as networking
 
 MODULE_DIR = os.path.dirname(__file__) 
 MAP_DIR = os.path.join(os.path.dirname(__file__), "map_files")
 
+class SilentSound:
+    """Stand-in for pg.mixer.Sound in headless mode"""
+    def play(self, *args, **kwargs):
+        pass
+    
+    def set_volume(self, volume):
+        pass
+
+
 class TankGame:
-    def __init__(self):
+    def __init__(self, headless: bool = False):
+        # Headless mode runs the update pipeline only (no window, no drawing and no mixer)
+        self.headless = headless
+        
         # Initialize Pygame
-        pg.init()
+        if self.headless:
+            os.environ["SDL_VIDEODRIVER"] = "dummy"     # Images still need a display surface to be converted
+            pg.display.init()
+        else:
+            pg.init()
         self.clock = pg.time.Clock()
         # self.last_frame_time = pg.time.get_ticks() / 1000  # Convert to seconds immediately
         self.fps = 100
@@ -44,7 +65,10 @@ class TankGame:
         # Create display with VSync enabled
         # Try different display modes for best results
         display_flags = pg.DOUBLEBUF | pg.HWSURFACE
-        self.screen = pg.display.set_mode(self.WINDOW_DIM, display_flags)
+        if self.headless:
+            self.screen = pg.display.set_mode((1, 1))
+        else:
+            self.screen = pg.display.set_mode(self.WINDOW_DIM, display_flags)
         
         # try:
         #     # First try with VSync
@@ -65,10 +89,15 @@ class TankGame:
         self.WINDOW_DIM_SCALED = self.WINDOW_W_SCALED, self.WINDOW_H_SCALED = int(self.WINDOW_W / (self.SCALE * 1.5)), int(self.WINDOW_H / self.SCALE)
         self.display = pg.Surface(self.WINDOW_DIM_SCALED)
 
-        # Game delta time (update time)
-        self.fixed_delta_time = True # Determines if the game logic scale with fps
+        # Simulation core: the world only advances in fixed ticks, drawing reads the state after the last tick
+        self.tick_rate = 100                # Simulation ticks per second
+        self.max_steps_per_frame = 5        # Max ticks run to catch up in one frame (the rest of the backlog is dropped)
+        self.ai_budget_tasks = 16           # Expensive AI tasks per AI tick (path distance, retarget, hit scan)
+        self.seed = None                    # Seed for the simulation RNG (set on map load, None for random)
         self.fixed_delta_time_accumulator = 0
-        self.fixed_delta_time_step = 1/100
+        self.fixed_delta_time_step = 1 / self.tick_rate
+        self.tick = 0                       # Ticks run since the map was loaded
+        self.frame_time = 0                 # Real time of the last frame (feeds the accumulator)
 
         # Debug fps counter
         self.frame = 0
@@ -81,18 +110,25 @@ class TankGame:
         self.units_dict = {}  # Maps tank IDs to unit objects
         self.units_player_controlled: list[Tank] = []
         
-        self.projectiles: list[Projectile] = []
+        self.projectile_pool = ProjectilePool()     # Storage for all projectiles
+        self.projectiles: list[Projectile] = []     # Views of the active projectiles in the pool
         
         self.obstacles_sta: list[Obstacle] = [] # standard
         self.obstacles_des: list[Obstacle] = [] # destructible
         self.obstacles_pit: list[Obstacle] = [] # pit
         self.obstacles_ai:  list[Obstacle] = [] # destructible + standard (changes based on whats destroyed)
         self.prev_obstacles_des:  list[Obstacle] = [] # Store previous frame des data
+        self.wall_index: EdgeGrid | None = None     # Grid over all obstacle edges (built in load_map)
         
         self.mines: list[Mine] = []
         
-        # Projectile collision distance
+        # Projectile collision distance (also used for projectile/mine hits)
         self.projectile_collision_dist = 10
+        self.projectile_hash = SpatialHash(cell_size=self.projectile_collision_dist)
+        
+        # Tanks closer than this are pushed apart
+        self.tank_collision_dist = 40
+        self.unit_hash = SpatialHash(cell_size=self.tank_collision_dist)
                 
         # Loadout
         self.selected_loadout = "player_classic"  # Default
@@ -100,13 +136,16 @@ class TankGame:
         # Game states:
         self.state = States.MENU
 
-        self.load_gui()                   
+        if not self.headless:
+            self.load_gui()                   
         self.load_animations_and_misc()   
         self.load_sound_effects()     
+        self.projectile_pool.init_sound_effects(self.sound_effects)
           
         self.dead_enemies_before_death = set()
         self.load_map()    # A bit dumb but needed for test map feature in settings              
-        self.load_map_textures()
+        if not self.headless:
+            self.load_map_textures()
         
         # Settings menu:
         self.show_obstacle_corners = False
@@ -132,6 +171,8 @@ class TankGame:
         self.active_proj_explosions = []
         self.active_tank_explosions = []
         self.active_mine_explosions = []
+        self.projectile_explosion_queue = []    # Positions of the projectiles that died since the last draw
+        self.tank_explosion_queue = []          # Positions of the tank explosions due since the last draw
         
         self.delta_time = 1
         self.old_delta_time = 1
@@ -156,9 +197,10 @@ class TankGame:
         self.new_life_interval = 5  # How many rounds before we get new life
         self.added_life = False
         
-        control_img_path = os.path.join(MODULE_DIR,"misc_images","control_page.png")
-        scale = 0.75
-        self.control_img = self.load_image(control_img_path, (self.WINDOW_DIM[0]//(2*scale),self.WINDOW_DIM[1]//(2*scale)))
+        if not self.headless:
+            control_img_path = os.path.join(MODULE_DIR,"misc_images","control_page.png")
+            scale = 0.75
+            self.control_img = self.load_image(control_img_path, (self.WINDOW_DIM[0]//(2*scale),self.WINDOW_DIM[1]//(2*scale)))
         
         # Multiplayer (currently not implemented)
         self.network = networking.Multiplayer()
@@ -339,17 +381,17 @@ class TankGame:
         """Loads animations and shared textures images"""
         try:
             # Death image
-            path_tank_death = os.path.join(MODULE_DIR, r"units\death_images", "tank_death3.png")
+            path_tank_death = os.path.join(MODULE_DIR, "units", "death_images", "tank_death3.png")
             self.tank_death_img = pg.image.load(path_tank_death).convert_alpha()
             self.tank_death_img = pg.transform.scale(self.tank_death_img, (self.WINDOW_DIM_SCALED[0],self.WINDOW_DIM_SCALED[1]))
             
             # Mine image
-            path_mine = os.path.join(MODULE_DIR, r"units\mines", "mine1.png")
+            path_mine = os.path.join(MODULE_DIR, "units", "mines", "mine1.png")
             self.mine_img = pg.image.load(path_mine).convert_alpha()
             self.mine_img = pg.transform.scale(self.mine_img, (self.WINDOW_DIM_SCALED[0],self.WINDOW_DIM_SCALED[1]))
             
             # Track image
-            track_path = os.path.join(MODULE_DIR,r"units\images", f"track.png")
+            track_path = os.path.join(MODULE_DIR, "units", "images", "track.png")
             track_img = pg.image.load(track_path).convert_alpha()
             self.track_img = pg.transform.scale(track_img, self.WINDOW_DIM_SCALED)
             
@@ -379,6 +421,12 @@ class TankGame:
             unit.init_animations(self.animations)
         
     def load_sound_effects(self) -> None:
+        if self.headless:
+            # The mixer is never initialized, so every sound is a silent stand-in
+            self.sound_effects = {name: [SilentSound()] for name in ("cannon", "death", "wallhit", "proj_explosion", "tracks",
+                                                                     "buttonspress", "gainlife", "lostlife", "nextlevel", "lostgame")}
+            return
+        
         pg.mixer.set_num_channels(64)
         self.sound_effects = {
             "cannon": [],
@@ -438,6 +486,12 @@ class TankGame:
     def load_map(self, map_path: str =  os.path.join(MAP_DIR, r"map_test1.txt")) -> None:
         """Loads data from a map file"""
         
+        # Restart the simulation clock and RNG, so a seeded map plays out the same every time
+        self.tick = 0
+        self.fixed_delta_time_accumulator = 0
+        if self.seed is not None:
+            random.seed(self.seed)
+        
         # ==================== Load map  ====================
         # Map data i a tuple, where 1 entre is the polygon defining the map border the second is a list of all polygon cornerlists
         self.polygon_list, self.polygons_with_type, unit_list, self.node_spacing = helper_functions.load_map_data(map_path)
@@ -451,11 +505,12 @@ class TankGame:
         
         self.map_size = (self.border_polygon[1][0] - self.border_polygon[0][0], self.border_polygon[1][1] - self.border_polygon[2][1])
         
-        # Get pathfinding data from map.
-        self.grid_dict = pathfinding.get_mapgrid_dict(self.polygon_list.copy(), self.node_spacing)
+        # Get pathfinding data from map. The node grid is computed once and shared by the graph and the nav context
+        map_grid, self.valid_nodes = pathfinding.find_valid_nodes(self.border_polygon, self.node_spacing, self.polygon_list_no_border) 
+        self.nav_graph = pathfinding.grid_to_graph(map_grid)
         
-        # Get valid nodes for path finding visuals
-        _, self.valid_nodes = pathfinding.find_valid_nodes(self.border_polygon, self.node_spacing, self.polygon_list_no_border) 
+        # Node array, KD-tree and node <-> grid maps shared by all tanks on the map
+        self.nav = NavContext(map_grid, self.valid_nodes, self.border_polygon[3], self.node_spacing)
 
         
         # ==================== Load map obstacles and units ====================
@@ -470,6 +525,14 @@ class TankGame:
         
         self.prev_obstacles_des = self.obstacles_des.copy()
         
+        # Spatial index over all obstacle edges, used by collision and ray queries
+        self.wall_index = EdgeGrid(self.obstacles_sta + self.obstacles_des + self.obstacles_pit)
+        self.ray_service = RayService(self.wall_index)  # Batched AI rays of each tick, shared by all AI tanks on the map
+        self.ray_cache = self.ray_service.ray_cache     # Turret ray paths
+        self.ai_scheduler = AIScheduler(budget_tasks=self.ai_budget_tasks)  # Task budget, phases and level of detail of the AI updates
+        self.nav.visibility = NodeVisibility(self.nav, self.wall_index, AI_OBSTACLE_TYPES)  # Which nodes can shoot at which
+        self.nav.flow_fields = FlowFieldService(self.nav_graph, self.nav.mine_layer)        # Path distance and pursuit toward the targets
+        
         # Tank mappings dict (maps a number to the json name, since map_files use number to store tank type, Could be done with list also, since tank numbering is 0-index)
         # Used for the textures and json. For players the "playerx_tank is for textures"
         # The json name for player loadouts are changed based on selected loadout
@@ -501,12 +564,12 @@ class TankGame:
                         }
         
         # Load ai config
-        with open(os.path.join(MODULE_DIR,r"units\ai.json"), 'r') as json_file:
+        with open(os.path.join(MODULE_DIR, "units", "ai.json"), 'r') as json_file:
             all_ai_data_json: dict = json.load(json_file)
         
         
         # Load unit config
-        with open(os.path.join(MODULE_DIR,r"units\units.json"), "r") as json_file:
+        with open(os.path.join(MODULE_DIR, "units", "units.json"), "r") as json_file:
             all_units_data_json: dict = json.load(json_file)
         
         # Unpack each unit map data
@@ -546,6 +609,7 @@ class TankGame:
                                     bounch_limit       = specific_unit_data["bounch_limit"] + 1,
                                     mine_limit         = specific_unit_data["mine_limit"],
                                     global_mine_list   = self.mines,
+                                    projectile_pool    = self.projectile_pool,
                                     projectile_limit   = specific_unit_data["projectile_limit"],
                                     images             = image_dict,
                                     use_turret         = True,
@@ -554,11 +618,12 @@ class TankGame:
                                     ai_type            = ai_type,
                                     use_mag_reload_logic = specific_unit_data.get("use_mag_reload_logic", False),
                                     mag_size = specific_unit_data.get("mag_size", 5),
-                                    reload_time = specific_unit_data.get("reload_time", 90)
+                                    reload_time = specific_unit_data.get("reload_time", 90),
+                                    mouse_aim = not self.headless
                                     )
                 
                 # Init waypoint processing for tank
-                unit_to_add.init_waypoint(self.grid_dict, self.border_polygon[3], self.node_spacing, self.valid_nodes)
+                unit_to_add.init_waypoint(self.nav_graph, self.border_polygon[3], self.node_spacing, self.nav)
 
                 self.units_dict[unit_to_add.id] = unit_to_add  # Seperate dict to store tank with its id
                 self.units.append(unit_to_add)
@@ -580,7 +645,7 @@ class TankGame:
             
             # Create combined obstacle list for ai targeting
             self.obstacles_ai = self.obstacles_sta + self.obstacles_des
-            unit.init_ai(self.obstacles_ai, self.projectiles, self.mines, ai_data)     
+            unit.init_ai(self.obstacles_ai, self.wall_index, self.projectiles, self.mines, ai_data, self.ray_service, self.ai_scheduler)     
             
             if unit.ai_type == "player":
                 self.units_player_controlled.append(unit)
@@ -830,9 +895,9 @@ class TankGame:
     def load_unit_textures(self, name: str) -> list:
         """Loads specific body and turret images for a given tank"""
         try:
-            path_tank = os.path.join(MODULE_DIR,r"units\images", f"{name}.png")
+            path_tank = os.path.join(MODULE_DIR, "units", "images", f"{name}.png")
             turret_name = name.split("_")[0]
-            path_tank_turret = os.path.join(MODULE_DIR,r"units\images", f"{turret_name}_turret.png")
+            path_tank_turret = os.path.join(MODULE_DIR, "units", "images", f"{turret_name}_turret.png")
             
             tank_img = pg.image.load(path_tank).convert_alpha()
             tank_img = pg.transform.scale(tank_img, (self.WINDOW_DIM_SCALED[0],self.WINDOW_DIM_SCALED[1]*1.2))
@@ -913,6 +978,27 @@ class TankGame:
         
     
     
+    def set_tick_rate(self, tick_rate: int) -> None:
+        self.tick_rate = tick_rate
+        self.fixed_delta_time_step = 1 / tick_rate
+    
+    def run_headless(self, map_name: str, ticks: int) -> float:
+        """Runs the update pipeline on a map for a number of ticks as fast as possible (nothing is drawn).
+        Returns the ticks per second"""
+        map_path = map_name if os.path.isfile(map_name) else os.path.join(MAP_DIR, f"{map_name}.txt")
+        self.clear_all_map_data()
+        self.load_map(map_path)
+        
+        # Every tick advances the world by the fixed step, no matter how long it took to compute
+        self.delta_time = self.fixed_delta_time_step
+        
+        start_time = time.perf_counter()
+        for _ in range(ticks):
+            self.update()
+        elapsed = time.perf_counter() - start_time
+        
+        return ticks / elapsed if elapsed > 0 else float("inf")
+    
     # ============================================ State methods ============================================
     def main_menu(self, event_list):
         if self.playthrough_started:
@@ -1383,8 +1469,8 @@ class TankGame:
             
             if keys[pg.K_p]:
                 print(f"{self.show_pathfinding_paths=}")
-                # Only start a path search/init if the grid_dict is present
-                if self.grid_dict is not None:
+                # Only start a path search/init if the nav graph is present
+                if self.nav_graph is not None:
                     self.units_player_controlled[self.player_controlled_tank_num].find_waypoint(mouse_pos)
 
             if keys[pg.K_o]:
@@ -1396,21 +1482,31 @@ class TankGame:
                     self.load_map()
                     self.load_map_textures()
 
-        if self.fixed_delta_time:
-            # Fixed timestep update for multiplayer
-            self.fixed_delta_time_accumulator += self.delta_time
+        self.advance_simulation(self.frame_time)
+        self.draw()
+    
+    def advance_simulation(self, frame_time: float) -> int:
+        """Runs as many fixed ticks as the real frame time covers (at most max_steps_per_frame). Returns the ticks run"""
+        self.fixed_delta_time_accumulator += frame_time
+        
+        steps = 0
+        while self.fixed_delta_time_accumulator >= self.fixed_delta_time_step and steps < self.max_steps_per_frame:
+            self.fixed_delta_time_accumulator -= self.fixed_delta_time_step
+            steps += 1
             
-            while self.fixed_delta_time_accumulator >= self.delta_time:
-                self.fixed_delta_time_accumulator -= self.delta_time
-                
-                self.update()
-                self.multiplayer_run_playing()
-                
-                
-            self.draw()
-        else:     
             self.update()
-            self.draw()
+            self.multiplayer_run_playing()
+            
+            # Stop stepping if the tick ended the round
+            if self.state != States.PLAYING:
+                self.fixed_delta_time_accumulator = 0
+                break
+        
+        # Too far behind: drop the backlog instead of spiralling (the game runs slower than real time)
+        if steps == self.max_steps_per_frame:
+            self.fixed_delta_time_accumulator = min(self.fixed_delta_time_accumulator, self.fixed_delta_time_step)
+        
+        return steps
     
     def switch_tank(self):
         self.player_controlled_tank_num += 1
@@ -1576,7 +1672,10 @@ class TankGame:
         self.obstacles_pit.clear()
         self.mines.clear()
         self.tracks.clear()
+        self.projectile_pool.clear()
         self.projectiles.clear()
+        self.projectile_explosion_queue.clear()
+        self.tank_explosion_queue.clear()
 
 
     # ============================================ Handle methods ============================================
@@ -1620,14 +1719,12 @@ class TankGame:
     # ============================================ Drawing/update ============================================     
 
     def update_delta_time(self):
-        if not self.fixed_delta_time:
-            # For singleplayer
-            current_time = time.perf_counter()
-            self.delta_time = min(current_time - self.last_frame_time, 0.1)
-            self.last_frame_time = current_time
-        else:
-            # For multiplayer
-            self.delta_time = self.fixed_delta_time_step
+        # Real frame time only decides how many ticks to run, each tick always advances by the fixed step
+        current_time = time.perf_counter()
+        self.frame_time = min(current_time - self.last_frame_time, 0.25)
+        self.last_frame_time = current_time
+        
+        self.delta_time = self.fixed_delta_time_step
 
             
     def update(self):        
@@ -1683,7 +1780,7 @@ class TankGame:
             for unit in self.units:
                 unit.send_delta(self.delta_time) # Send delta time to tank instances
                 
-                if not unit.dead and unit.is_moving:
+                if not self.headless and not unit.dead and unit.is_moving:
                     # Add track mark at tank's position
                     track_pos = unit.pos
                     track_angle = unit.degrees + 90
@@ -1694,60 +1791,46 @@ class TankGame:
         # Update and remove old tracks
         self.tracks = [track for track in self.tracks if track.update(self.delta_time*60)]
         
-        # Temp list is created and all units' projectiles are added to a single list
-        temp_projectiles = []
-        for unit in self.units:
-            unit.update(self.delta_time)
-            temp_projectiles.extend(unit.projectiles)
+        # AI runs at its own fixed rate, derived from the tick counter so it doesn't drift
+        ai_steps = (self.tick + 1) * AI_TICK_RATE // self.tick_rate - self.tick * AI_TICK_RATE // self.tick_rate
+        if ai_steps:
+            self.ai_scheduler.begin_tick()
+        unit_ai_steps = [self.ai_scheduler.steps_for(unit, ai_steps) for unit in self.units]    # 0 for dead units and units without AI
+        if ai_steps:
+            # Resolve the rays every AI will ask for this tick in one batch
+            updating_ais = [unit.ai for unit, steps in zip(self.units, unit_ai_steps) if steps]
+            self.ray_service.prepare(updating_ais, self.projectile_pool)
+        for unit, steps in zip(self.units, unit_ai_steps):
+            unit.update(self.delta_time, steps)
+        self.tick += 1
 
         for mine in self.mines:
             mine.update(self.delta_time)
         
-        # Update projectiles and handle collisions
-        for unit in self.units:
-            for i, proj in enumerate(unit.projectiles):
-                
-                proj.set_delta_time(self.delta_time) # Send frame delta time
-                proj.update()                   # Update the projectile
-                
-                for obstacle in self.obstacles_sta:
-                    for corner_pair in obstacle.get_corner_pairs():
-                        proj.collision(corner_pair)
-                        
-                for obstacle in self.obstacles_des:
-                    for corner_pair in obstacle.get_corner_pairs():
-                        proj.collision(corner_pair)
-                        
-                # Check projectile collision with other units
-                projectile_line = proj.get_line()
-                for other_unit in self.units:
-                    if other_unit.dead:
-                        continue  # Ignore dead units
-                    
-                    # # Skip unit if the projecile has been newly-fired from the same unit (prevents tank exploding itself)
-                    if proj.spawn_timer > 0 and proj.id == other_unit.id:
-                        continue
-                    
-                    if other_unit.collision(projectile_line, collision_type="projectile"):
-                        proj.alive = False
+        # Move projectiles and bounce them on the standard and destructible walls in one batch
+        self.projectile_pool.update(self.delta_time, self.wall_index, types=(0, 1))
+        self.projectiles = self.projectile_pool.active_views()
+        
+        # Check the paths the projectiles moved along this tick against the unit hitboxes
+        self.handle_projectile_unit_hits()
                 
-        # Projectile/projectile collision check
-        if temp_projectiles:
-            projectile_positions = np.array([proj.pos for proj in temp_projectiles])
-            tree = KDTree(projectile_positions)
-
-            for i, proj in enumerate(temp_projectiles):
-                neighbors = tree.query_ball_point(proj.pos, self.projectile_collision_dist)
-                for j in neighbors:
-                    if i != j:  # Avoid self-collision
-                        temp_projectiles[i].alive = False
-                        temp_projectiles[j].alive = False
-
-                # Check for mine hit
-                for mine in self.mines:
-                     if helper_functions.distance(mine.pos, proj.pos) < 10:
-                        mine.explode()
-                        temp_projectiles[i].alive = False
+        # Projectile/projectile and projectile/mine collision check
+        self.update_projectile_hash()
+        for key_a, key_b in self.projectile_hash.pairs(self.projectile_collision_dist):
+            a_is_mine = isinstance(key_a, Mine)
+            b_is_mine = isinstance(key_b, Mine)
+            if a_is_mine and b_is_mine:
+                continue  # Mines don't collide with each other
+            
+            if a_is_mine:
+                key_a.explode()
+            else:
+                key_a.alive = False
+            
+            if b_is_mine:
+                key_b.explode()
+            else:
+                key_b.alive = False
 
         for unit in self.units:
             # Send new projectile info to AI
@@ -1756,60 +1839,118 @@ class TankGame:
                 unit.ai.projectiles = self.projectiles
 
             # Check unit/surface collisions
-            for obstacle in self.obstacles_sta:
-                for corner_pair in obstacle.get_corner_pairs():
-                    unit.collision(corner_pair, collision_type="surface")
-                    
-            for obstacle in self.obstacles_des:
-                for corner_pair in obstacle.get_corner_pairs():
-                    unit.collision(corner_pair, collision_type="surface")
-
-            for obstacle in self.obstacles_pit:
-                for corner_pair in obstacle.get_corner_pairs():
-                    unit.collision(corner_pair, collision_type="surface")
-
-
-            # Check for unit-unit collision
-            for other_unit in self.units:
-                if unit == other_unit or other_unit.dead:
-                    continue  # Skip self and dead units
-
-                if not self.are_tanks_close(unit, other_unit):
-                    continue  # Skip if tanks aren't close
-
-                # Skip collision check with dead tanks
-                if other_unit.dead or unit.dead:
-                    continue
-                
-                # Push tanks when colliding
-                unit.apply_repulsion(other_unit, push_strength=0.5)
-                other_unit.apply_repulsion(unit, push_strength=0.5)  # Ensure symmetry
-            
-
-            # Mine logic
-            for mine in self.mines:
-                if mine.is_exploded:
-                    self.handle_mine_explosion(mine)
-                    self.handle_destruction()
-                    self.mines.remove(mine)
-                    self.update_des_flag = True
-                mine.get_unit_list(self.units)
-                mine.get_obstacles_des(self.obstacles_des)
-                
-                if unit.dead == False:
-                    mine.check_for_tank(unit)
+            unit.collide_with_walls(self.wall_index)
+        
+        # Hash the alive tanks once per tick for the unit-unit and mine checks
+        self.unit_hash.clear()
+        for unit in self.units:
+            if not unit.dead:
+                self.unit_hash.insert(unit, unit.pos)
+        
+        # Push tanks when colliding. Each close pair once, the call moves both tanks (1.0 per tank and tick, like
+        # the two half strength pushes every tank got when all ordered pairs were visited)
+        for unit, other_unit in self.unit_hash.pairs(self.tank_collision_dist):
+            unit.apply_repulsion(other_unit, push_strength=1.0)
+        
+        # Mine logic
+        for mine in self.mines[:]:
+            mine.get_unit_list(self.units)
+            mine.get_obstacles_des(self.obstacles_des)
+            
+            if mine.is_exploded:
+                self.handle_mine_explosion(mine)
+                self.handle_destruction()
+                self.mines.remove(mine)
+                self.nav.mine_layer.remove_mine(mine)
+                self.update_des_flag = True
+                continue
+            
+            for unit in self.unit_hash.query_radius(mine.pos, mine.explode_radius):
+                mine.check_for_tank(unit)
+        
+        # Free the slots of the projectiles that died this tick. Their explosions (and the ones of the
+        # tanks that died recently) are queued here, so draw() starts each of them once, however many ticks a frame runs
+        dead_projectile_positions = self.projectile_pool.release_dead()
+        if not self.headless:
+            self.projectile_explosion_queue.extend(tuple(pos) for pos in dead_projectile_positions.tolist())
+            self.tank_explosion_queue.extend(tuple(unit.pos) for unit in self.units if unit.dead and unit.time_of_death < 10)
+        self.projectiles = self.projectile_pool.active_views()
+        for unit in self.units:
+            if unit.ai is not None:
+                unit.ai.projectiles = self.projectiles
 
 
-        self.projectiles = temp_projectiles
     
+    def update_projectile_hash(self) -> None:
+        """Keeps the persistent projectile/mine hash in sync with the projectile pool and the mine list.
+        Keys that stayed in the same cell since last tick are left untouched"""
+        projectile_hash = self.projectile_hash
+        pool = self.projectile_pool
+        slots = np.flatnonzero(pool.active).tolist()
+        current = {pool.views[slot] for slot in slots}
+        current.update(self.mines)
+        
+        # Drop released projectiles and exploded mines
+        for key in [key for key in projectile_hash.positions if key not in current]:
+            projectile_hash.remove(key)
+        
+        for slot, pos in zip(slots, pool.pos[slots].tolist()):
+            projectile_hash.move(pool.views[slot], pos)
+        for mine in self.mines:
+            projectile_hash.move(mine, mine.pos)
+    
+    def handle_projectile_unit_hits(self) -> None:
+        hitbox_edges = []
+        edge_owners = []
+        for unit in self.units:
+            if unit.dead:
+                continue  # Ignore dead units
+            for start_point, end_point in unit.hitbox_lines:
+                hitbox_edges.append((*start_point, *end_point))
+                edge_owners.append(unit.id)
+        
+        hits = self.projectile_pool.find_unit_hits(np.array(hitbox_edges, dtype=np.float64).reshape(-1, 4), np.array(edge_owners, dtype=np.int64))
+        for proj, unit_id in hits:
+            self.units_dict[unit_id].make_dead(True)
+            proj.alive = False
     
     def handle_destruction(self):
         if len(self.obstacles_des) != len(self.prev_obstacles_des):
+            # Remove destroyed obstacles from the edge index
+            removed = [obstacle for obstacle in self.prev_obstacles_des if obstacle not in self.obstacles_des]
+            for obstacle in removed:
+                self.wall_index.remove_obstacle(obstacle)
+                self.polygon_list_no_border = [polygon for polygon in self.polygon_list_no_border if polygon is not obstacle.corners]
+            self.ray_cache.invalidate()
+            
+            # Open the nav cells the obstacles covered (bumps the graph version, which drops the cached paths).
+            # A new node set gets a new visibility table, otherwise only the pairs crossing the obstacles are re-cast
+            map_grid, valid_nodes = pathfinding.find_valid_nodes(self.border_polygon, self.node_spacing, self.polygon_list_no_border)
+            if self.nav_graph.set_grid(map_grid):
+                self.rebuild_nav(map_grid, valid_nodes)
+            else:
+                for obstacle in removed:
+                    self.nav.visibility.obstacle_removed(obstacle)
+            
             self.update_des_flag = True
-            self.des_texture_surface = self.wrap_texture_on_polygon_type(self.obstacles_des, self.images_des)
+            if not self.headless:
+                self.des_texture_surface = self.wrap_texture_on_polygon_type(self.obstacles_des, self.images_des)
             self.prev_obstacles_des = self.obstacles_des.copy()
             self.obstacles_ai = self.obstacles_sta + self.obstacles_des
  
+    def rebuild_nav(self, map_grid: np.ndarray, valid_nodes: list[tuple]) -> None:
+        """Replaces the nav context after the node set changed. Node ids change with it, so the mine layer,
+        visibility and flow fields are rebuilt too and every tank gets the new context"""
+        self.valid_nodes = valid_nodes
+        self.nav = NavContext(map_grid, valid_nodes, self.border_polygon[3], self.node_spacing)
+        for mine in self.mines:
+            self.nav.mine_layer.add_mine(mine)
+        self.nav.visibility = NodeVisibility(self.nav, self.wall_index, AI_OBSTACLE_TYPES)
+        self.nav.flow_fields = FlowFieldService(self.nav_graph, self.nav.mine_layer)
+        
+        for unit in self.units:
+            unit.update_pathfinding(self.nav_graph, self.nav)
+    
     def draw(self):
 
         """Render all objects on the screen."""
@@ -1892,13 +2033,14 @@ class TankGame:
                 self.active_mine_explosions.remove(animation)       
         
         
-        for proj in self.projectiles:
-            if not proj.alive:
-                self.handle_projectile_explosion(proj)
+        # Explosions queued by the ticks since the last frame
+        for pos in self.projectile_explosion_queue:
+            self.handle_projectile_explosion(pos)
+        self.projectile_explosion_queue.clear()
                 
-        for unit in self.units:
-            if unit.time_of_death < 10 and unit.dead:
-                self.handle_tank_explosion(unit)
+        for pos in self.tank_explosion_queue:
+            self.handle_tank_explosion(pos)
+        self.tank_explosion_queue.clear()
         
         
         # ======================== DEBUG VISUALS ===================================
@@ -2012,17 +2154,17 @@ class TankGame:
             pg.draw.rect(self.screen, (0, 0, 0), rect, 1)
 
 
-    def handle_projectile_explosion(self, proj: Projectile) -> None:
-        proj.play_explosion()   # Play sound
+    def handle_projectile_explosion(self, pos: tuple) -> None:
+        self.projectile_pool.play_explosion()   # Play sound
         
         animation = Animation(images=self.animations["proj_explosion"], frame_delay=2, delta_time=self.delta_time)
-        animation.start(pos=proj.pos, angle=0)
+        animation.start(pos=pos, angle=0)
         self.active_proj_explosions.append(animation)
         
-    def handle_tank_explosion(self, unit: Tank) -> None:
+    def handle_tank_explosion(self, pos: tuple) -> None:
 
         animation = Animation(images=self.animations["tank_explosion"], frame_delay=6, delta_time=self.delta_time)
-        animation.start(pos=unit.pos, angle=0)
+        animation.start(pos=pos, angle=0)
         
         self.active_tank_explosions.append(animation)
         
@@ -2063,7 +2205,12 @@ class TankGame:
                 f"Valid nodes: {len(self.units[1].ai.valid_nodes)}",
                 f"Closets proj: {self.units[1].ai.closest_projectile[1]}",
                 f"Dodge cooldown: {self.units[1].ai.dodge_cooldown}",
-                f"AI accu: {self.units[1].ai.update_accumulator:.5f}",
+                f"Tick: {self.tick}",
+                f"Ray cache: {len(self.ray_cache)} paths, {self.ray_cache.hits} hits / {self.ray_cache.misses} misses",
+                f"AI work: {self.ai_scheduler.stats()}",
+                f"Bank shots: {self.ray_service.bank_shots.fans_traced} fans, {self.ray_service.bank_shots.hits} hits / {self.ray_service.bank_shots.misses} misses",
+                f"Path cache: {len(self.nav_graph.path_cache)} paths, {self.nav_graph.path_cache.hits} hits ({self.nav_graph.path_cache.suffix_hits} suffix) / {self.nav_graph.path_cache.misses} misses",
+                f"Flow fields: {len(self.nav.flow_fields)} fields, {self.nav.flow_fields.built} built / {self.nav.flow_fields.hits} hits",
                 f"Tank 1: {self.units[1].ai.salvo_cooldown:.5f}"
             ]
         else:
@@ -2083,20 +2230,10 @@ class TankGame:
             self.screen.blit(text_surface, (x_start, y_start))
             y_start += 25  # Spacing between lines
     
-    def are_tanks_close(self, tank1: Tank, tank2: Tank, threshold=40) -> bool:
-        """Optimized proximity check using squared distance."""
-        # Get the center coordinates of both tanks
-        pos1 = tank1.pos
-        pos2 = tank2.pos
-        # Calculate the squared distance between the two centers (no sqrt for performance)
-        dx = pos1[0] - pos2[0]
-        dy = pos1[1] - pos2[1]
-        return dx*dx + dy*dy <= threshold*threshold    
-    
     def clear_all_projectiles(self):
-        # Clear for each unit
-        for unit in self.units:
-            unit.projectiles.clear()
+        # Free every slot in the pool (the units read their projectiles from it)
+        self.projectile_pool.clear()
+        self.projectile_hash.clear()
         
         # Clear global list
         self.projectiles.clear()
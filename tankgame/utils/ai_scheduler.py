@@ -0,0 +1,112 @@
+import math
+import time
+from collections import defaultdict
+
+
+# Central scheduling of the AI updates. Expensive, periodic AI work (path distance, target
+# reselection, hit scan) is spread over the AI ticks by giving every AI its own phase, and only a
+# fixed number of these tasks run per AI tick; the rest is deferred to the next AI tick. The budget
+# counts tasks, not time, so a seeded run makes the same decisions on every machine. AIs far away
+# from every enemy run their periodic work less often, but every AI still updates every AI tick
+# (turret rotation, shooting and cooldowns are never skipped).
+
+STAGGER_PERIOD = 60     # AI ticks the phases are spread over (matches the slowest periodic AI work)
+
+# (min distance to nearest enemy, multiplier of the periodic work interval). First match from the top is used
+LOD_LEVELS = ((1200, 4),
+              (700, 2),
+              (0, 1))
+
+
+class AIScheduler:
+    def __init__(self, budget_tasks: int = 16, lod: bool = True):
+        self.budget = budget_tasks      # Expensive AI tasks allowed per AI tick
+        self.lod = lod                  # Periodic work less often for AIs far from enemies
+        self.used = 0                   # Tasks run this AI tick
+        self.spent = 0.0                # Seconds the tasks of this AI tick took (debug only, never used for decisions)
+        self.total_spent = 0.0          # Seconds all tasks took since the scheduler was created (debug only)
+        self.ai_tick = 0
+        self.registered = 0
+
+        self.lod_interval = {}          # ai -> multiplier of its periodic work interval, set once per AI tick
+
+        # Debug counters
+        self.ran = defaultdict(int)         # task -> times run
+        self.deferred = defaultdict(int)    # task -> times postponed because the budget was used
+        self.lod_skipped = 0                # Periodic checks skipped by the level of detail
+
+    def register(self, ai) -> None:
+        """Gives the AI its phase, so its periodic work does not land on the same tick as the other AIs"""
+        ai.frame_counter = (self.registered * 7) % STAGGER_PERIOD   # 7 is coprime with the period, neighbouring AIs land far apart
+        self.registered += 1
+
+    def begin_tick(self) -> None:
+        """Called once before the AIs of an AI tick update"""
+        self.used = 0
+        self.spent = 0.0
+        self.ai_tick += 1
+
+    def steps_for(self, unit, ai_steps: int) -> int:
+        """Number of AI updates the unit gets this simulation tick (0 for dead units and units without AI).
+        Also refreshes the level of detail of the AI"""
+        ai = unit.ai
+        if ai is None or unit.dead or ai_steps == 0:
+            return 0
+        self.lod_interval[ai] = self.update_interval(ai) if self.lod else 1
+        return ai_steps
+
+    def update_interval(self, ai) -> int:
+        """Multiplier of the periodic work interval, from the distance to the closest enemy"""
+        if ai.closest_projectile[1] < ai.dist_start_dodge:
+            return 1    # Incoming projectile, full rate regardless of distance
+
+        enemies = [target.pos for target in ai.potential_targets if not target.dead]
+        if not enemies:
+            return LOD_LEVELS[0][1]
+        x, y = ai.tank.pos
+        dist = min(math.hypot(ex - x, ey - y) for ex, ey in enemies)
+        for min_dist, interval in LOD_LEVELS:
+            if dist >= min_dist:
+                return interval
+        return 1
+
+    def is_due(self, ai, period: int) -> bool:
+        """True on the frames periodic work with the given period is due for the AI. Far AIs only get every
+        2nd/4th of those frames (the level of detail)"""
+        if ai.frame_counter % period != 0:
+            return False
+        if not self._lod_allows(ai, ai.frame_counter, period):
+            self.lod_skipped += 1
+            return False
+        return True
+
+    def due_next(self, ai, period: int) -> bool:
+        """is_due for the AI's next update (its frame counter is incremented first), without counting LOD skips.
+        Used to prepare the batched work of an AI tick before the AIs update"""
+        frame = ai.frame_counter + 1
+        return frame % period == 0 and self._lod_allows(ai, frame, period)
+
+    def _lod_allows(self, ai, frame: int, period: int) -> bool:
+        return (frame // period) % self.lod_interval.get(ai, 1) == 0
+
+    def run(self, task: str, func) -> bool:
+        """Runs func if there is budget left this AI tick. Returns False if the task was deferred"""
+        if self.used >= self.budget:
+            self.deferred[task] += 1
+            return False
+
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        self.spent += elapsed
+        self.total_spent += elapsed
+        self.used += 1
+        self.ran[task] += 1
+        return True
+
+    def stats(self) -> str:
+        """Totals since the scheduler was created, followed by the values of the last AI tick"""
+        deferred = sum(self.deferred.values())
+        ran = sum(self.ran.values())
+        return (f"{ran} ran / {deferred} deferred, {self.lod_skipped} LOD skips, {self.total_spent * 1000:.2f} ms in total "
+                f"(last AI tick: {self.used}/{self.budget} tasks, {self.spent * 1000:.2f} ms)")
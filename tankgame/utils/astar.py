@@ -0,0 +1,98 @@
+import heapq
+
+
+# A* over the integer node ids of a NavGraph. The per node buffers (g cost, parent, open/closed marks)
+# are allocated once per graph and reused by every search: each search gets a new generation number,
+# and a buffer entry only counts if it was written in the current generation, so nothing has to be
+# cleared between searches. Heap entries are (f, h, node), so among equal f the node closest to the
+# goal is expanded first, and entries left behind by a later, cheaper push are skipped when popped.
+
+class AStar:
+    def __init__(self, graph, diagonal_cost: float):
+        n = len(graph)
+        self.graph = graph
+        self.diagonal_extra = diagonal_cost - 1     # Octile heuristic: max(dx, dy) + diagonal_extra * min(dx, dy)
+
+        self.g = [0.0] * n          # Cost from start (valid if seen[node] == generation)
+        self.parent = [-1] * n      # Previous node on the best known path (valid if seen[node] == generation)
+        self.seen = [0] * n         # Generation the node was last reached in
+        self.closed = [0] * n       # Generation the node was last expanded in
+        self.generation = 0
+        self.out_of_budget = False  # True if the last search stopped at max_expansions (None does not mean unreachable)
+
+        # Debug counters
+        self.searches = 0
+        self.expansions = 0
+
+    def search(self, start: int, goal: int, extra: dict | None = None, max_expansions: int | None = None) -> list[int] | None:
+        """Node ids of the cheapest path from start to goal (both included).
+
+        Args:
+            extra (dict | None): node id -> extra cost for entering the node
+            max_expansions (int | None): give up (return None) after expanding this many nodes
+
+        Returns:
+            list[int] | None: the path, None if there is none (or the budget ran out)
+        """
+        graph = self.graph
+        indptr, indices, costs = graph.indptr_list, graph.indices_list, graph.costs_list
+        width = graph.width
+        g, parent, seen, closed = self.g, self.parent, self.seen, self.closed
+        diagonal_extra = self.diagonal_extra
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        self.generation += 1
+        generation = self.generation
+        self.searches += 1
+
+        goal_y, goal_x = divmod(goal, width)
+        start_y, start_x = divmod(start, width)
+        dx, dy = abs(start_x - goal_x), abs(start_y - goal_y)
+        h = max(dx, dy) + diagonal_extra * min(dx, dy)
+
+        g[start] = 0.0
+        parent[start] = -1
+        seen[start] = generation
+        open_list = [(h, h, start)]
+        expansions = 0
+        self.out_of_budget = False
+
+        while open_list:
+            _, _, current = heappop(open_list)
+            if closed[current] == generation:
+                continue    # Stale entry, the node was already expanded through a cheaper push
+
+            if current == goal:
+                self.expansions += expansions
+                path = []
+                while current != -1:
+                    path.append(current)
+                    current = parent[current]
+                return path[::-1]
+
+            closed[current] = generation
+            expansions += 1
+            if max_expansions is not None and expansions > max_expansions:
+                self.out_of_budget = True
+                break
+
+            current_g = g[current]
+            for i in range(indptr[current], indptr[current + 1]):
+                neighbor = indices[i]
+                if closed[neighbor] == generation:
+                    continue
+
+                new_g = current_g + costs[i]
+                if extra:
+                    new_g += extra.get(neighbor, 0)
+                if seen[neighbor] != generation or new_g < g[neighbor]:
+                    seen[neighbor] = generation
+                    g[neighbor] = new_g
+                    parent[neighbor] = current
+                    y, x = divmod(neighbor, width)
+                    dx, dy = abs(x - goal_x), abs(y - goal_y)
+                    h = dx + diagonal_extra * dy if dx > dy else dy + diagonal_extra * dx
+                    heappush(open_list, (new_g + h, h, neighbor))
+
+        self.expansions += expansions
+        return None
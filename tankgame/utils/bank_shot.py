@@ -0,0 +1,106 @@
+import numpy as np
+from collections import OrderedDict
+import utils.batch_geometry as batch_geometry
+
+
+# Ricochet shot search. A fan of firing angles is traced with all its bounces in one vectorized pass
+# per origin cell, and the angles whose path passes the target are kept per target cell. The AI then
+# only checks those few paths against the current positions of its allies and itself.
+
+class BankShotSolver:
+    def __init__(self, wall_index, edge_types: tuple, angle_count: int = 360, cell_size: float = 20.0,
+                 muzzle_offset: float = 30.0, max_fans: int = 256, max_size: int = 4096):
+        self.wall_index = wall_index
+        self.edge_types = edge_types
+        self.angle_count = angle_count
+        self.cell_size = cell_size          # Origin and target quantization in pixels
+        self.muzzle_offset = muzzle_offset  # Paths start this far from the tank centre (like the turret ray)
+        self.max_fans = max_fans            # A fan is (angle_count, bounces + 1, 4) floats, so fewer of them are kept
+        self.max_size = max_size
+
+        self.angles = np.arange(angle_count) * (360 / angle_count)
+        rads = np.radians(self.angles)
+        self.directions = np.stack((np.cos(rads), np.sin(rads)), axis=1)
+
+        self.fans = OrderedDict()       # (origin cell, bounces, wall version) -> (angle_count, bounces + 1, 4) segments, NaN padded
+        self.candidates = OrderedDict() # (origin cell, target cell, bounces, threshold, wall version) -> angle ids whose path passes the target
+
+        # Debug counters
+        self.fans_traced = 0
+        self.hits = 0
+        self.misses = 0
+
+    def cell(self, pos: tuple) -> tuple[int, int]:
+        return round(pos[0] / self.cell_size), round(pos[1] / self.cell_size)
+
+    def fan(self, origin_cell: tuple, bounces: int) -> np.ndarray:
+        """All paths of the fan from the centre of origin_cell (traced once per cell, bounce count and wall set)"""
+        key = (origin_cell, bounces, self.wall_index.version)
+        segments = self.fans.get(key)
+        if segments is not None:
+            self.fans.move_to_end(key)
+            return segments
+
+        origin = np.array(origin_cell, dtype=np.float64) * self.cell_size
+        origins = origin + self.directions * self.muzzle_offset
+        paths = self.wall_index.trace_paths(origins, self.directions, np.full(self.angle_count, bounces), self.edge_types)
+
+        segments = np.full((self.angle_count, bounces + 1, 4), np.nan)
+        for row, path in enumerate(paths):
+            for leg, (start, end) in enumerate(path):
+                segments[row, leg] = (*start, *end)
+
+        self._put(self.fans, key, segments, self.max_fans)
+        self.fans_traced += 1
+        return segments
+
+    def solve(self, origin: tuple, target: tuple, blockers: list[tuple], bounces: int,
+              shoot_threshold: float, safe_threshold: float) -> np.ndarray:
+        """Firing angles (degrees) whose path passes target without passing any of the blockers"""
+        origin_cell = self.cell(origin)
+        key = (origin_cell, self.cell(target), bounces, shoot_threshold, self.wall_index.version)
+        angle_ids = self.candidates.get(key)
+        if angle_ids is None:
+            self.misses += 1
+            segments = self.fan(origin_cell, bounces)
+            flat = segments.reshape(-1, 4)
+            valid = ~np.isnan(flat[:, 0])
+            target_point = np.array(self.cell(target), dtype=np.float64)[None, :] * self.cell_size
+            hits = np.zeros(len(flat), dtype=bool)
+            hits[valid] = batch_geometry.points_near_segments(flat[valid], target_point, np.array([shoot_threshold]))[:, 0]
+            angle_ids = np.flatnonzero(hits.reshape(self.angle_count, bounces + 1).any(axis=1))
+            self._put(self.candidates, key, angle_ids, self.max_size)
+        else:
+            self.candidates.move_to_end(key)
+            self.hits += 1
+
+        if len(angle_ids) == 0 or not blockers:
+            return self.angles[angle_ids]
+
+        # Drop the angles whose path also passes an ally or the tank itself
+        segments = self.fan(origin_cell, bounces)[angle_ids]     # (k, bounces + 1, 4)
+        flat = segments.reshape(-1, 4)
+        valid = ~np.isnan(flat[:, 0])
+        points = np.array(blockers, dtype=np.float64).reshape(-1, 2)
+        blocked = np.zeros(len(flat), dtype=bool)
+        blocked[valid] = batch_geometry.points_near_segments(flat[valid], points, np.full(len(points), float(safe_threshold))).any(axis=1)
+        safe = ~blocked.reshape(len(angle_ids), bounces + 1).any(axis=1)
+        return self.angles[angle_ids[safe]]
+
+    def best_angle(self, current_angle: float, *args, **kwargs) -> float | None:
+        """The angle from solve closest to current_angle (least turret rotation), None if there is none"""
+        angles = self.solve(*args, **kwargs)
+        if len(angles) == 0:
+            return None
+        diff = np.abs((angles - current_angle + 180) % 360 - 180)
+        return float(angles[np.argmin(diff)])
+
+    def invalidate(self) -> None:
+        self.fans.clear()
+        self.candidates.clear()
+
+    def _put(self, cache: OrderedDict, key: tuple, value, max_size: int) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        if len(cache) > max_size:
+            cache.popitem(last=False)
@@ -0,0 +1,101 @@
+import numpy as np
+
+
+# Vectorized geometry used when many segments/rays are tested against the walls in the same frame
+
+EPSILON = 1e-9
+
+def first_hits(starts: np.ndarray, ends: np.ndarray, edges: np.ndarray, mask: np.ndarray | None = None,
+               edge_normals: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Finds the first wall edge each segment crosses, all segments in one call.
+
+    Args:
+        starts (np.ndarray): (n, 2) segment start points
+        ends (np.ndarray): (n, 2) segment end points
+        edges (np.ndarray): (m, 4) wall edges as rows of x1, y1, x2, y2
+        mask (np.ndarray | None): optional (n, m) bool array, False for segment/edge pairs to ignore
+        edge_normals (np.ndarray | None): optional precomputed (m, 2) unit normals of the edges (either side)
+
+    Returns:
+        np.ndarray: (n,) index of the first edge hit, -1 if no hit
+        np.ndarray: (n, 2) hit points (undefined where there is no hit)
+        np.ndarray: (n, 2) unit normals of the hit edges facing the incoming segment
+    """
+    n = len(starts)
+    edge_index = np.full(n, -1, dtype=np.int64)
+    points = np.zeros((n, 2))
+    normals = np.zeros((n, 2))
+    if n == 0 or len(edges) == 0:
+        return edge_index, points, normals
+
+    p = starts[:, None, :]              # (n, 1, 2)
+    r = (ends - starts)[:, None, :]     # (n, 1, 2)
+    q = edges[None, :, 0:2]             # (1, m, 2)
+    s = edges[None, :, 2:4] - q         # (1, m, 2)
+
+    # Solve p + t*r = q + u*s for every segment/edge pair
+    denominator = r[..., 0] * s[..., 1] - r[..., 1] * s[..., 0]
+    qp = q - p
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = (qp[..., 0] * s[..., 1] - qp[..., 1] * s[..., 0]) / denominator
+        u = (qp[..., 0] * r[..., 1] - qp[..., 1] * r[..., 0]) / denominator
+
+    hit = ((denominator != 0.0)
+           & (t >= -EPSILON) & (t <= 1 + EPSILON)
+           & (u >= -EPSILON) & (u <= 1 + EPSILON))
+    if mask is not None:
+        hit &= mask
+
+    # Nearest hit along each segment
+    t = np.where(hit, t, np.inf)
+    first = np.argmin(t, axis=1)
+    rows = np.flatnonzero(hit[np.arange(n), first])
+    if len(rows) == 0:
+        return edge_index, points, normals
+
+    chosen = first[rows]
+    edge_index[rows] = chosen
+    points[rows] = starts[rows] + t[rows, chosen][:, None] * (ends[rows] - starts[rows])
+
+    # Unit normal of the edge, flipped so it faces the incoming segment
+    if edge_normals is not None:
+        normal = edge_normals[chosen]
+    else:
+        edge_vec = edges[chosen, 2:4] - edges[chosen, 0:2]
+        normal = np.stack((-edge_vec[:, 1], edge_vec[:, 0]), axis=1)
+        normal /= np.linalg.norm(normal, axis=1)[:, None]
+    facing = np.einsum("ij,ij->i", normal, ends[rows] - starts[rows]) < 0
+    normals[rows] = np.where(facing[:, None], normal, -normal)
+
+    return edge_index, points, normals
+
+def points_near_segments(segments: np.ndarray, points: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """Tests every point against every segment at once: the point must lie between the segment ends
+    (projected on the segment) and closer than its threshold to the line through the segment.
+
+    Args:
+        segments (np.ndarray): (s, 4) segments as rows of x1, y1, x2, y2
+        points (np.ndarray): (p, 2) points
+        thresholds (np.ndarray): (p,) max distance per point
+
+    Returns:
+        np.ndarray: (s, p) bool, True where the point is within threshold of the segment
+    """
+    starts = segments[:, None, 0:2]                 # (s, 1, 2)
+    vectors = segments[:, None, 2:4] - starts       # (s, 1, 2)
+    to_points = points[None, :, :] - starts         # (s, p, 2)
+
+    dot = np.sum(vectors * to_points, axis=2)
+    length_sq = np.sum(vectors * vectors, axis=2)
+    between = (dot >= 0) & (np.sum(to_points * to_points, axis=2) <= length_sq)
+
+    # Perpendicular distance to the line (zero length segments never match)
+    cross = np.abs(vectors[..., 0] * to_points[..., 1] - vectors[..., 1] * to_points[..., 0])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        near = cross / np.sqrt(length_sq) < thresholds[None, :]
+    return between & near & (length_sq > 0)
+
+def reflect(directions: np.ndarray, normals: np.ndarray) -> np.ndarray:
+    """Reflects (n, 2) direction vectors on (n, 2) unit normals"""
+    dot = np.einsum("ij,ij->i", directions, normals)
+    return directions - 2 * dot[:, None] * normals
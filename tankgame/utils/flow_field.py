@@ -0,0 +1,116 @@
+import heapq
+import math
+from collections import OrderedDict
+
+
+# Flow fields toward the AI targets. One Dijkstra from the target's grid cell gives every cell its
+# cost to the target and the next cell on the cheapest path there, so every AI chasing the same
+# target reads its path distance and next step with a lookup instead of running its own A*. A field
+# is rebuilt only when the target moves to another cell (or the nav grid or the mine costs change).
+
+class FlowField:
+    """Cheapest paths from every cell of a NavGraph to one target cell"""
+
+    def __init__(self, graph, target: int, extra: dict):
+        self.graph = graph
+        self.target = target
+        n = len(graph)
+        indptr, indices, costs = graph.indptr_list, graph.indices_list, graph.costs_list
+
+        self.cost = [math.inf] * n      # Path cost to the target (mine costs included)
+        self.steps = [-1] * n           # Steps to the target, -1 if it can't be reached
+        self.next = [-1] * n            # Next node toward the target
+
+        self.cost[target] = 0.0
+        self.steps[target] = 0
+        heap = [(0.0, target)]
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if cost > self.cost[node]:
+                continue    # Stale entry
+
+            # Edges into free cells go both ways with the same step cost, so the outgoing edges of a
+            # node are the edges leading to it. Entering it adds its extra cost, like in find_path
+            cost += extra.get(node, 0)
+            for i in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[i]
+                new_cost = cost + costs[i]
+                if new_cost < self.cost[neighbor]:
+                    self.cost[neighbor] = new_cost
+                    self.steps[neighbor] = self.steps[node] + 1
+                    self.next[neighbor] = node
+                    heapq.heappush(heap, (new_cost, neighbor))
+
+    def next_node(self, node: int) -> int:
+        """Next node toward the target (-1 if there is none). A tank in a blocked cell steps to its best neighbour"""
+        if self.steps[node] > 0:
+            return self.next[node]
+        if self.steps[node] == 0:
+            return -1
+
+        graph = self.graph
+        best, best_cost = -1, math.inf
+        for i in range(graph.indptr_list[node], graph.indptr_list[node + 1]):
+            neighbor = graph.indices_list[i]
+            if self.cost[neighbor] + graph.costs_list[i] < best_cost:
+                best, best_cost = neighbor, self.cost[neighbor] + graph.costs_list[i]
+        return best
+
+    def steps_from(self, node: int) -> int:
+        """Steps from node to the target, -1 if it can't be reached"""
+        if node < 0:
+            return -1
+        if self.steps[node] >= 0:
+            return self.steps[node]
+        neighbor = self.next_node(node)
+        return self.steps[neighbor] + 1 if neighbor >= 0 else -1
+
+    def path_from(self, node: int) -> list[tuple[int, int]] | None:
+        """Grid cells (x, y) of the path from node to the target (both included), None if it can't be reached"""
+        if self.steps_from(node) < 0:
+            return None
+        path = [self.graph.cell(node)]
+        while node != self.target:
+            node = self.next_node(node)
+            path.append(self.graph.cell(node))
+        return path
+
+
+class FlowFieldService:
+    """Flow fields of the current target cells, shared by all AIs on a map"""
+
+    def __init__(self, graph, mine_layer, max_fields: int = 32):
+        self.graph = graph
+        self.mine_layer = mine_layer
+        self.max_fields = max_fields
+        self.fields = OrderedDict()     # (target node, graph version, mine version) -> FlowField, least recently used first
+
+        # Debug counters
+        self.built = 0
+        self.hits = 0
+
+    def __len__(self):
+        return len(self.fields)
+
+    def field(self, target_cell: tuple[int, int]) -> FlowField | None:
+        """Flow field toward a grid cell (x, y), None if the cell is outside the grid"""
+        target = self.graph.node_id(target_cell)
+        if target < 0:
+            return None
+
+        key = (target, self.graph.version, self.mine_layer.version)
+        field = self.fields.get(key)
+        if field is not None:
+            self.fields.move_to_end(key)
+            self.hits += 1
+            return field
+
+        field = FlowField(self.graph, target, self.graph.cost_by_id(self.mine_layer.cell_cost))
+        self.fields[key] = field
+        self.built += 1
+        if len(self.fields) > self.max_fields:
+            self.fields.popitem(last=False)
+        return field
+
+    def invalidate(self) -> None:
+        self.fields.clear()
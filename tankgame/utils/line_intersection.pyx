@@ -1,5 +1,7 @@
 # cython: boundscheck=False, wraparound=False, nonecheck=False
 
+from libc.math cimport sqrt, INFINITY
+
 cdef double EPSILON = 1e-9
 
 def line_intersection(double x1, double y1, double x2, double y2,
@@ -50,3 +52,58 @@ def line_intersection(double x1, double y1, double x2, double y2,
         return px, py
 
     return -1.0, -1.0
+
+
+cdef Py_ssize_t _nearest_hit(double x1, double y1, double x2, double y2,
+                             const double[:, ::1] edges, double min_dist,
+                             double *hit_x, double *hit_y, double *hit_dist) nogil:
+    """Nearest edge crossed by the segment (x1, y1) -> (x2, y2), ignoring hits closer than min_dist.
+    Writes the hit point and distance and returns the edge index (-1 if no hit)"""
+    cdef Py_ssize_t i, best = -1
+    cdef double rx = x2 - x1, ry = y2 - y1
+    cdef double length = sqrt(rx * rx + ry * ry)
+    cdef double best_t = INFINITY
+    cdef double min_t, sx, sy, qpx, qpy, denominator, t, u
+
+    if length == 0.0:
+        return -1
+    min_t = min_dist / length
+
+    for i in range(edges.shape[0]):
+        sx = edges[i, 2] - edges[i, 0]
+        sy = edges[i, 3] - edges[i, 1]
+
+        # Solve p + t*r = q + u*s
+        denominator = rx * sy - ry * sx
+        if denominator == 0.0:
+            continue
+        qpx = edges[i, 0] - x1
+        qpy = edges[i, 1] - y1
+        t = (qpx * sy - qpy * sx) / denominator
+        u = (qpx * ry - qpy * rx) / denominator
+
+        if (t >= -EPSILON and t <= 1.0 + EPSILON and u >= -EPSILON and u <= 1.0 + EPSILON
+                and t > min_t and t < best_t):
+            best_t = t
+            best = i
+
+    if best >= 0:
+        hit_x[0] = x1 + best_t * rx
+        hit_y[0] = y1 + best_t * ry
+        hit_dist[0] = best_t * length
+    return best
+
+
+def nearest_hit(double x1, double y1, double x2, double y2, const double[:, ::1] edges, double min_dist=0.0):
+    """Finds the nearest edge crossed by the segment (x1, y1) -> (x2, y2) in one call.
+
+    Args:
+        edges: contiguous (m, 4) float64 buffer with rows of x1, y1, x2, y2
+        min_dist: hits closer than this to the segment start are ignored (avoids self intersection after a bounce)
+
+    Returns:
+        tuple: (px, py, edge_index, distance). edge_index is -1 and the point (-1.0, -1.0) when nothing is hit
+    """
+    cdef double px = -1.0, py = -1.0, dist = INFINITY
+    cdef Py_ssize_t index = _nearest_hit(x1, y1, x2, y2, edges, min_dist, &px, &py, &dist)
+    return px, py, index, dist
@@ -0,0 +1,116 @@
+import numpy as np
+from scipy.spatial import KDTree
+import utils.pathfinding as pathfinding
+
+
+# Navigation data of a map. Built once in load_map and shared by reference by every tank on the map
+
+class NavContext:
+    """Valid pathfinding nodes of a map with a KD-tree over them and the node <-> grid cell mapping"""
+
+    def __init__(self, map_grid: np.ndarray, valid_nodes: list[tuple], top_left: tuple, node_spacing: int):
+        self.map_grid = map_grid            # Grid cell (row y, col x) -> 1 if blocked, 0 if free
+        self.top_left = top_left
+        self.node_spacing = node_spacing
+
+        self.node_list = valid_nodes                                        # Node id -> (x, y) pixel coord
+        self.node_set = set(valid_nodes)                                    # For fast "is this a valid node" lookups
+        self.nodes = np.array(valid_nodes, dtype=np.float64).reshape(-1, 2) # (n, 2) pixel coords
+        self.kd_tree = KDTree(self.nodes) if len(self.nodes) else None
+
+        # Node id -> grid cell (x, y), and grid cell (row y, col x) -> node id (-1 if blocked)
+        self.node_cells = np.array([pathfinding.pygame_to_grid(node, top_left, node_spacing) for node in valid_nodes], dtype=np.int64).reshape(-1, 2)
+        self.cell_node = np.full(map_grid.shape, -1, dtype=np.int64)
+        rows, cols = map_grid.shape
+        in_grid = (self.node_cells[:, 0] < cols) & (self.node_cells[:, 1] < rows)    # Nodes on a partial last row/col have no grid cell
+        self.cell_node[self.node_cells[in_grid, 1], self.node_cells[in_grid, 0]] = np.flatnonzero(in_grid)
+
+        # Mine danger overlay on the nodes
+        self.mine_layer = MineCostLayer(self)
+        
+        # Node to node visibility (NodeVisibility), set in load_map once the wall index exists
+        self.visibility = None
+        
+        # Flow fields toward the AI targets (FlowFieldService), set in load_map once the nav graph exists
+        self.flow_fields = None
+
+    def __len__(self):
+        return len(self.node_list)
+
+    def nodes_within(self, pos: tuple, radius: float) -> list[int]:
+        """Ids of all nodes within radius of pos"""
+        if self.kd_tree is None:
+            return []
+        return self.kd_tree.query_ball_point(pos, radius)
+
+    def nearest_node(self, pos: tuple) -> int:
+        """Id of the node closest to pos (-1 if the map has no nodes)"""
+        if self.kd_tree is None:
+            return -1
+        return int(self.kd_tree.query(pos)[1])
+
+    def node_at_cell(self, cell: tuple[int, int]) -> int:
+        """Node id of grid cell (x, y), -1 if the cell is blocked or outside the grid"""
+        x, y = cell
+        rows, cols = self.cell_node.shape
+        if 0 <= x < cols and 0 <= y < rows:
+            return int(self.cell_node[y, x])
+        return -1
+
+
+MINE_CELL_COST = 20     # Extra A* cost for entering a cell inside a mine explosion radius (a straight step costs 1)
+
+class MineCostLayer:
+    """Per node count of the mines threatening it. Updated when a mine is laid or explodes, so AI mine
+    avoidance and A* read the danger instead of checking every node against every mine"""
+
+    def __init__(self, nav: NavContext):
+        self.nav = nav
+        self.danger_count = np.zeros(len(nav), dtype=np.int32)  # Mines with the node inside their explode radius
+        self.wide_count = np.zeros(len(nav), dtype=np.int32)    # Mines with the node inside twice their explode radius
+        self.cell_cost = {}                                     # Grid cell (x, y) -> extra A* cost, only dangerous cells
+        self.mine_nodes = {}                                    # mine -> (danger node ids, wide node ids)
+        self.version = 0                                        # Bumped every time the overlay changes
+
+    def __len__(self):
+        return len(self.mine_nodes)
+
+    def add_mine(self, mine) -> None:
+        if mine in self.mine_nodes:
+            return
+        danger_ids = np.asarray(self.nav.nodes_within(mine.pos, mine.explode_radius), dtype=np.int64)
+        wide_ids = np.asarray(self.nav.nodes_within(mine.pos, mine.explode_radius * 2), dtype=np.int64)
+        self.mine_nodes[mine] = (danger_ids, wide_ids)
+
+        self.danger_count[danger_ids] += 1
+        self.wide_count[wide_ids] += 1
+        for cell in map(tuple, self.nav.node_cells[danger_ids].tolist()):
+            self.cell_cost[cell] = MINE_CELL_COST
+        self.version += 1
+
+    def remove_mine(self, mine) -> None:
+        if mine not in self.mine_nodes:
+            return
+        danger_ids, wide_ids = self.mine_nodes.pop(mine)
+
+        self.danger_count[danger_ids] -= 1
+        self.wide_count[wide_ids] -= 1
+        cleared = danger_ids[self.danger_count[danger_ids] == 0]
+        for cell in map(tuple, self.nav.node_cells[cleared].tolist()):
+            self.cell_cost.pop(cell, None)
+        self.version += 1
+
+    def clear(self) -> None:
+        self.danger_count[:] = 0
+        self.wide_count[:] = 0
+        self.cell_cost.clear()
+        self.mine_nodes.clear()
+        self.version += 1
+
+    def is_dangerous(self, node_id: int) -> bool:
+        return self.danger_count[node_id] > 0
+
+    def safe_node_ids(self, wide: bool = False) -> np.ndarray:
+        """Ids of the nodes outside every mine radius (twice the radius if wide)"""
+        counts = self.wide_count if wide else self.danger_count
+        return np.flatnonzero(counts == 0)
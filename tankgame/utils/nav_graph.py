@@ -0,0 +1,99 @@
+import numpy as np
+from utils.astar import AStar
+from utils.path_cache import PathCache
+
+
+# Navigation graph of a map grid in compressed sparse row (CSR) form. Every grid cell is a node with
+# the integer id y * width + x, and the neighbours of node i are indices[indptr[i]:indptr[i + 1]] with
+# the step costs at the same positions in costs. Blocked cells keep their outgoing edges (a tank
+# standing in one can still leave it), but no edge leads into a blocked cell.
+
+DIAGONAL_COST = 1.4
+
+# (dx, dy, cost) in the neighbour order of each node
+NEIGHBOR_STEPS = ((-1, -1, DIAGONAL_COST), (0, -1, 1), (1, -1, DIAGONAL_COST),
+                  (-1, 0, 1),                          (1, 0, 1),
+                  (-1, 1, DIAGONAL_COST),  (0, 1, 1),  (1, 1, DIAGONAL_COST))
+
+
+class NavGraph:
+    def __init__(self, map_grid: np.ndarray):
+        self.version = 0                    # Bumped every time the blocked cells change
+        self.path_cache = PathCache()       # Paths of find_path, keyed by this version (and the cell cost version)
+        self.build(map_grid)
+
+    def build(self, map_grid: np.ndarray) -> None:
+        self.height, self.width = map_grid.shape
+        self.blocked = np.asarray(map_grid) != 0        # (height, width), True for cells inside a polygon
+        free = ~self.blocked
+
+        # Free mask padded with a blocked border, so a shifted view is False outside the grid
+        padded = np.zeros((self.height + 2, self.width + 2), dtype=bool)
+        padded[1:-1, 1:-1] = free
+
+        def shifted(dx: int, dy: int) -> np.ndarray:
+            """(height, width) bool, True where cell (x + dx, y + dy) is free"""
+            return padded[1 + dy:1 + dy + self.height, 1 + dx:1 + dx + self.width]
+
+        # (cells, 8) edge mask. A diagonal step also needs both cells it cuts past to be free
+        edge_mask = np.empty((self.height * self.width, len(NEIGHBOR_STEPS)), dtype=bool)
+        for column, (dx, dy, _) in enumerate(NEIGHBOR_STEPS):
+            allowed = shifted(dx, dy)
+            if dx != 0 and dy != 0:
+                allowed = allowed & shifted(dx, 0) & shifted(0, dy)
+            edge_mask[:, column] = allowed.ravel()
+
+        ids = np.arange(self.height * self.width, dtype=np.int32)
+        offsets = np.array([dy * self.width + dx for dx, dy, _ in NEIGHBOR_STEPS], dtype=np.int32)
+        step_costs = np.array([cost for _, _, cost in NEIGHBOR_STEPS], dtype=np.float64)
+
+        self.indptr = np.zeros(len(ids) + 1, dtype=np.int32)
+        np.cumsum(edge_mask.sum(axis=1), out=self.indptr[1:])
+        self.indices = (ids[:, None] + offsets[None, :])[edge_mask]                 # Row major, so grouped per node
+        self.costs = np.broadcast_to(step_costs, edge_mask.shape)[edge_mask]
+
+        # Node id -> grid cell (x, y)
+        self.coords = np.stack((ids % self.width, ids // self.width), axis=1)
+
+        # Python list mirrors for the search loop (indexing lists is much faster than numpy scalars)
+        self.indptr_list = self.indptr.tolist()
+        self.indices_list = self.indices.tolist()
+        self.costs_list = self.costs.tolist()
+
+        # Search engine with its reusable per node buffers
+        self.astar = AStar(self, DIAGONAL_COST)
+
+    def set_grid(self, map_grid: np.ndarray) -> bool:
+        """Rebuilds the graph if the blocked cells changed (e.g. a destructible obstacle was removed). Returns True if they did"""
+        if map_grid.shape == self.blocked.shape and np.array_equal(np.asarray(map_grid) != 0, self.blocked):
+            return False
+        self.build(map_grid)
+        self.version += 1
+        return True
+
+    def __len__(self):
+        return self.height * self.width
+
+    def node_id(self, cell: tuple[int, int]) -> int:
+        """Node id of grid cell (x, y), -1 if the cell is outside the grid"""
+        x, y = cell
+        if 0 <= x < self.width and 0 <= y < self.height:
+            return y * self.width + x
+        return -1
+
+    def cell(self, node_id: int) -> tuple[int, int]:
+        """Grid cell (x, y) of a node id"""
+        y, x = divmod(node_id, self.width)
+        return x, y
+
+    def neighbors(self, node_id: int) -> list[tuple[tuple[int, int], float]]:
+        """[((x, y), cost), ...] of a node, like the old grid dict values"""
+        start, end = self.indptr_list[node_id], self.indptr_list[node_id + 1]
+        return [(self.cell(neighbor), cost) for neighbor, cost in zip(self.indices_list[start:end], self.costs_list[start:end])]
+
+    def cost_by_id(self, cell_cost: dict | None) -> dict[int, float]:
+        """{(x, y): cost} extra entering costs re-keyed by node id (cells outside the grid are dropped)"""
+        if not cell_cost:
+            return {}
+        width, height = self.width, self.height
+        return {y * width + x: cost for (x, y), cost in cell_cost.items() if 0 <= x < width and 0 <= y < height}
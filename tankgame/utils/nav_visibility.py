@@ -0,0 +1,102 @@
+import numpy as np
+import utils.batch_geometry as batch_geometry
+
+
+# Node to node visibility of a map. Row a holds one bit per node: 1 if the straight line from node a
+# to that node crosses no blocking wall. Rows are cast in vectorized chunks the first time a node is
+# asked about and stored packed (1 bit per pair). When a destructible obstacle is removed, only the
+# blocked pairs whose line crosses its bounding box are cast again.
+
+CHUNK_SIZE = 512    # Rays per first_hits call (bounds the (rays, edges) temporaries)
+
+
+class NodeVisibility:
+    def __init__(self, nav, wall_index, edge_types: tuple):
+        self.nav = nav
+        self.wall_index = wall_index
+        self.edge_types = edge_types
+        self.rows = {}      # node id -> packed visibility row (uint8, ceil(n / 8) bytes)
+
+        # Debug counters
+        self.rows_cast = 0
+        self.pairs_recast = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _cast(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """True for the segments that cross no blocking wall. A row fans out over the whole map, so it is
+        tested against all edges instead of the EdgeGrid cells"""
+        edges = self.wall_index.edge_array(types=self.edge_types)
+        normals = self.wall_index.normal_array(types=self.edge_types)
+        free = np.ones(len(starts), dtype=bool)
+        for i in range(0, len(starts), CHUNK_SIZE):
+            edge_index, _, _ = batch_geometry.first_hits(starts[i:i + CHUNK_SIZE], ends[i:i + CHUNK_SIZE], edges, edge_normals=normals)
+            free[i:i + CHUNK_SIZE] = edge_index < 0
+        return free
+
+    def row(self, node_id: int) -> np.ndarray:
+        """Packed visibility row of a node, cast on first use"""
+        packed = self.rows.get(node_id)
+        if packed is None:
+            nodes = self.nav.nodes
+            free = self._cast(np.repeat(nodes[node_id][None, :], len(nodes), axis=0), nodes)
+            packed = np.packbits(free)
+            self.rows[node_id] = packed
+            self.rows_cast += 1
+        return packed
+
+    def build(self) -> None:
+        """Casts every row up front (map compile time instead of on first use)"""
+        for node_id in range(len(self.nav)):
+            self.row(node_id)
+
+    def visible(self, a: int, b: int) -> bool:
+        """Can a shot go straight from node a to node b. Visibility is symmetric, so a cached row of b is used too"""
+        packed = self.rows.get(a)
+        if packed is None and b in self.rows:
+            a, b, packed = b, a, self.rows[b]
+        if packed is None:
+            packed = self.row(a)
+        return bool((packed[b >> 3] >> (7 - (b & 7))) & 1)
+
+    def visible_from(self, a: int) -> np.ndarray:
+        """(n,) bool, the nodes visible from node a"""
+        return np.unpackbits(self.row(a), count=len(self.nav)).astype(bool)
+
+    def obstacle_removed(self, obstacle) -> None:
+        """Re-casts the blocked pairs whose line crosses the removed obstacle (call after it left the wall index)"""
+        if not self.rows:
+            return
+        nodes = self.nav.nodes
+        min_x, min_y, max_x, max_y = obstacle.aabb
+        for node_id, packed in self.rows.items():
+            free = np.unpackbits(packed, count=len(nodes)).astype(bool)
+            start = nodes[node_id]
+            candidates = np.flatnonzero(~free)
+            candidates = candidates[_segments_cross_box(start, nodes[candidates], min_x, min_y, max_x, max_y)]
+            if len(candidates) == 0:
+                continue
+            free[candidates] = self._cast(np.repeat(start[None, :], len(candidates), axis=0), nodes[candidates])
+            self.rows[node_id] = np.packbits(free)
+            self.pairs_recast += len(candidates)
+
+    def invalidate(self) -> None:
+        self.rows.clear()
+
+
+def _segments_cross_box(start: np.ndarray, ends: np.ndarray, min_x: float, min_y: float, max_x: float, max_y: float) -> np.ndarray:
+    """(k,) bool, True for the segments from start to each end that touch the box (slab test)"""
+    t_enter = np.zeros(len(ends))
+    t_exit = np.ones(len(ends))
+    inside = np.ones(len(ends), dtype=bool)
+    for axis, low, high in ((0, min_x, max_x), (1, min_y, max_y)):
+        d = ends[:, axis] - start[axis]
+        parallel = d == 0
+        inside &= ~parallel | ((start[axis] >= low) & (start[axis] <= high))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t_low = (low - start[axis]) / d
+            t_high = (high - start[axis]) / d
+        t_enter = np.where(parallel, t_enter, np.maximum(t_enter, np.minimum(t_low, t_high)))
+        t_exit = np.where(parallel, t_exit, np.minimum(t_exit, np.maximum(t_low, t_high)))
+    return inside & (t_enter <= t_exit)
@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+
+# Memoization of A* paths. AIs ask for the same start and goal cells over and over (path distance,
+# re-pathing on every waypoint), and a cheapest path is made of cheapest paths: every suffix of a
+# cached path is the cheapest path from that cell to the same goal. So a query that starts on a
+# cached path toward its goal is answered with the rest of that path, without a search.
+
+class PathCache:
+    """Bounded LRU cache of grid paths, keyed by (start cell, goal cell, nav version)"""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self.paths = OrderedDict()      # (start, goal, version) -> tuple of cells, () if there is no path
+        self.suffixes = {}              # (goal, version) -> {cell: (key of a path through it, index in that path)}
+        self.version = None             # Nav version of the cached paths, other versions clear the cache
+
+        # Debug counters
+        self.hits = 0
+        self.suffix_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def get(self, start: tuple, goal: tuple, version: tuple) -> tuple | None:
+        """Cached path from start to goal (() if there is none), None on a miss"""
+        self._sync_version(version)
+
+        key = (start, goal, version)
+        path = self.paths.get(key)
+        if path is not None:
+            self.paths.move_to_end(key)
+            self.hits += 1
+            return path
+
+        suffix = self.suffixes.get((goal, version), {}).get(start)
+        if suffix is not None:
+            path_key, index = suffix
+            self.paths.move_to_end(path_key)
+            self.hits += 1
+            self.suffix_hits += 1
+            return self.paths[path_key][index:]
+
+        self.misses += 1
+        return None
+
+    def put(self, start: tuple, goal: tuple, version: tuple, path: list | None) -> None:
+        self._sync_version(version)
+        key = (start, goal, version)
+        if key in self.paths:
+            self._drop(key)
+        path = tuple(path) if path else ()
+        self.paths[key] = path
+        self.paths.move_to_end(key)
+
+        if path:
+            cells = self.suffixes.setdefault((goal, version), {})
+            for index, cell in enumerate(path):
+                cells[cell] = (key, index)
+
+        if len(self.paths) > self.max_size:
+            self._drop(next(iter(self.paths)))
+
+    def _drop(self, key: tuple) -> None:
+        """Removes a path and the suffix entries that point into it"""
+        path = self.paths.pop(key)
+        _, goal, version = key
+        cells = self.suffixes.get((goal, version))
+        if cells is None:
+            return
+        for cell in path:
+            if cells.get(cell, (None,))[0] == key:
+                del cells[cell]
+        if not cells:
+            del self.suffixes[(goal, version)]
+
+    def _sync_version(self, version: tuple) -> None:
+        """Drops the paths of other versions, so the cache only ever holds paths of one version"""
+        if version != self.version:
+            self.invalidate()
+            self.version = version
+
+    def invalidate(self) -> None:
+        """Drops all paths (the nav grid or the cell costs changed)"""
+        self.paths.clear()
+        self.suffixes.clear()
@@ -1,11 +1,8 @@
 import pygame as pg
-import utils.helper_functions as hf
 import numpy as np
 import triangle as tr
-import heapq
-from collections import defaultdict
+from utils.nav_graph import NavGraph
 import time 
-import math
 
 
 # Collection of function used for path finding
@@ -41,8 +38,42 @@ def split_polygon_into_triangles(polygon: list[tuple]) -> list[tuple]:
     
     return triangle_list
         
+def points_in_triangles(points: np.ndarray, triangles: np.ndarray) -> np.ndarray:
+    """ Vectorized point in triangle test (points on an edge count as inside)
+
+    Args:
+        points (np.ndarray): (n, 2) points
+        triangles (np.ndarray): (t, 3, 2) triangle corners
+
+    Returns:
+        np.ndarray: (n,) bool, true for the points inside any of the triangles
+    """
+    inside = np.zeros(len(points), dtype=bool)
+    if len(triangles) == 0 or len(points) == 0:
+        return inside
+    
+    # Degenerate (zero area) triangles contain nothing
+    a, b, c = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+    area = (b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0])
+    triangles = triangles[area != 0]
+    
+    # Triangles in chunks, so the (n, chunk) temporaries stay small
+    for i in range(0, len(triangles), 256):
+        chunk = triangles[i:i + 256]
+        signs = []
+        for j in range(3):
+            start, end = chunk[None, :, j], chunk[None, :, (j + 1) % 3]     # (1, t, 2)
+            rel = points[:, None, :] - start                                # (n, t, 2)
+            signs.append((end[..., 0] - start[..., 0]) * rel[..., 1] - (end[..., 1] - start[..., 1]) * rel[..., 0])
+        d1, d2, d3 = signs
+        has_neg = (d1 < 0) | (d2 < 0) | (d3 < 0)
+        has_pos = (d1 > 0) | (d2 > 0) | (d3 > 0)
+        inside |= np.any(~(has_neg & has_pos), axis=1)
+    return inside
+
 def find_valid_nodes(corners: list[tuple], node_spacing: int, polygons: list[list[tuple]]) -> tuple:
-    """ Find all nodes in a grid that is not inside of a polygon
+    """ Find all nodes in a grid that is not inside of a polygon. Each polygon is triangulated once and
+    all nodes are tested against all triangles in one vectorized pass
 
     Args:
         corners (list[tuple]): list of corners coordinates
@@ -50,8 +81,8 @@ def find_valid_nodes(corners: list[tuple], node_spacing: int, polygons: list[lis
         polygons list[list[tuple]]: list of polygons. A polygon is a list of points (tuples) (EXCLUDING THE CORNER POLYGON!)
 
     Returns:
-        list[tuple]: the valid node list - nodes that are not inside a polygon
         ndarray: a grid with invalid nodes marked as 1 and valid as 0
+        list[tuple]: the valid node list - nodes that are not inside a polygon
     """
 
     bot_left, bot_right, top_right, top_left = corners[0], corners[1], corners[2], corners[3]
@@ -63,146 +94,67 @@ def find_valid_nodes(corners: list[tuple], node_spacing: int, polygons: list[lis
     grid_nodes_x = grid_size_x // node_spacing
     grid_nodes_y = grid_size_y // node_spacing
 
-    valid_nodes = []  # List to store nodes outside any polygon
     map_grid = np.zeros([grid_nodes_y,grid_nodes_x])
     
-    # Loop through the grid and collect valid nodes
-    for x in range(start_offset, grid_size_x, node_spacing):
-        for y in range(start_offset, grid_size_y, node_spacing):
-            
-            # Find offset to map top left corner
-            offset_x, offset_y = top_left
-            node = (x + offset_x, y + offset_y)
-            
-            # Check if this node is inside any of the polygons sub triangles
-            is_inside = False
-            for polygon in polygons:
-                triangles = split_polygon_into_triangles(np.array(polygon))
-                for triangle in triangles:
-                    if hf.check_triangle(triangle, node):
-                        is_inside = True
-                        
-            # If the node (point) is not inside then we add it to valid nodes
-            if not is_inside:
-                valid_nodes.append(node)
-            else:
-                map_grid[y//node_spacing,x//node_spacing] = 1
-                
+    # All grid nodes relative to the map top left corner, column by column (x outer, y inner)
+    xs = np.arange(start_offset, grid_size_x, node_spacing)
+    ys = np.arange(start_offset, grid_size_y, node_spacing)
+    rel_x, rel_y = np.meshgrid(xs, ys, indexing="ij")
+    rel_x, rel_y = rel_x.ravel(), rel_y.ravel()
+    offset_x, offset_y = top_left
+    nodes = np.column_stack((rel_x + offset_x, rel_y + offset_y))
+    
+    # Triangulate every polygon once
+    triangles = []
+    for polygon in polygons:
+        triangles += split_polygon_into_triangles(np.array(polygon))
+    triangles = np.array(triangles, dtype=np.float64).reshape(-1, 3, 2)
+    
+    is_inside = points_in_triangles(nodes.astype(np.float64), triangles)
+    
+    # Mark blocked nodes in the grid (nodes on a partial last row/col have no grid cell)
+    blocked_x, blocked_y = rel_x[is_inside] // node_spacing, rel_y[is_inside] // node_spacing
+    in_grid = (blocked_x < grid_nodes_x) & (blocked_y < grid_nodes_y)
+    map_grid[blocked_y[in_grid], blocked_x[in_grid]] = 1
+    
+    valid_nodes = [tuple(node) for node in nodes[~is_inside].tolist()]
     return map_grid, valid_nodes
 
-def grid_to_dict(grid: np.ndarray) -> dict:
-        
-    y_size, x_size = grid.shape
-
-    coord_list = []
-
-    # Define relative neighbor positions
-    k = 1   # Hardcoded at 1
-    neighbors = [(-k,-k), (0,-k), (k,-k), (-k,0), (k,0), (-k,k), (0,k), (k,k)]
-
-    coord_dict = defaultdict(list)
-
-    for y in range(y_size):
-        for x in range(x_size):
-            coord_list.append((x, y))  # Store the coordinate
-            
-            temp_coord = []
-            
-            for dx, dy in neighbors:
-                nx, ny = x + dx, y + dy  # Compute neighbor coordinates
-                
-                # Ensure the neighbor is within bounds
-                if 0 <= nx < x_size and 0 <= ny < y_size and grid[ny, nx] == 0:
-                    
-                    # Check for diagonal neighbors' validity
-                    if dx == -1 and dy == -1:  # Top-left
-                        coord =((nx,ny), 1.4)
-                        if grid[y, x-1] == 1 or grid[y-1, x] == 1:
-                            continue  
-                    elif dx == 1 and dy == -1:  # Top-right
-                        coord =((nx,ny), 1.4)
-                        if grid[y, x+1] == 1 or grid[y-1, x] == 1:
-                            continue
-                    elif dx == -1 and dy == 1:  # Bottom-left
-                        coord =((nx,ny), 1.4)
-                        if grid[y, x-1] == 1 or grid[y+1, x] == 1:
-                            continue
-                    elif dx == 1 and dy == 1:  # Bottom-right
-                        coord =((nx,ny), 1.4)
-                        if grid[y, x+1] == 1 or grid[y+1, x] == 1:
-                            continue
-                    else:
-                        coord =((nx,ny), 1)
-                        
-                    temp_coord.append(coord)  # Append valid neighbor
-            
-            coord_dict[(x,y)] = (temp_coord)
-            
-            #print(f"({x}, {y}) -> Neighbors: {temp_coord}")
-
-    return coord_dict
+def grid_to_graph(grid: np.ndarray) -> NavGraph:
+    """Navigation graph (CSR arrays over integer node ids) of a map grid, built with array shifts"""
+    return NavGraph(grid)
 # --- helpers ---
 
 # --- func to use ---
-def get_mapgrid_dict(polygons: list[list[tuple]], node_spacing: int) -> dict:
+# This is used by a unit each time it need to find a path
+def find_path(graph: NavGraph, start_coord: tuple[int, int], end_coord: tuple[int, int], cell_cost: dict | None = None,
+              max_expansions: int | None = None, cost_version: int | None = None):
+    """A* pathfinding (octile heuristic, reused search buffers). cell_cost optionally maps grid cells to an extra
+    cost for entering them (e.g. mine danger). max_expansions caps the search, None is returned if it runs out.
+    Paths are cached per graph version. With a cell_cost, cost_version must identify its contents, or the cache is skipped"""
     
-    all_triangles = []
-    for polygon in polygons:
-        triangles = split_polygon_into_triangles(np.array(polygon))
-        all_triangles += triangles
-        
-    if len(all_triangles) > 2:
-        # Remove map triangles (two)
-        all_triangles.pop(0)
-        all_triangles.pop(0)
-
-
-    corners = polygons.pop(0)
+    if start_coord == end_coord:
+        return [start_coord]
     
-    # Node spacing is the quality of the pathfinding grid
-    map_grid, valid_nodes = find_valid_nodes(corners, node_spacing, polygons)    
-
-    # Convert grid to a dictionary that stores each coords(nodes) neighbors and costs (only ran once per map)
-    return grid_to_dict(map_grid)
-
-# This is used by a unit each time it need to find a path
-def find_path(grid_dict: dict[tuple, list], start_coord: tuple[int, int], end_coord: tuple[int, int]):
-    """Optimized A* pathfinding"""
+    start, goal = graph.node_id(start_coord), graph.node_id(end_coord)
+    if start < 0 or goal < 0:
+        return None
+    
+    # Cached path (or a suffix of a cached path toward the same goal)
+    use_cache = not cell_cost or cost_version is not None
+    version = (graph.version, cost_version if cell_cost else None)
+    if use_cache:
+        cached = graph.path_cache.get(start_coord, end_coord, version)
+        if cached is not None:
+            return list(cached) if cached else None
+    
+    path = graph.astar.search(start, goal, graph.cost_by_id(cell_cost), max_expansions)
+    if path is not None:
+        path = [graph.cell(node_id) for node_id in path]
     
-    open_list = [(0, start_coord)]  # Priority queue (min heap)
-    heapq.heapify(open_list)  # Ensures it's a valid heap
-
-    g_cost = {start_coord: 0}  # Cost from start
-    came_from = {}  # To reconstruct path
-    closed_list = set()  # Explored nodes
-
-    while open_list:
-        _, current = heapq.heappop(open_list)  # Pop lowest cost node
-
-        if current == end_coord:
-            path = []
-            while current in came_from:
-                path.append(current)
-                current = came_from[current]
-            path.append(start_coord)
-            return path[::-1]
-
-        closed_list.add(current)
-
-        # Explore neighbors
-        current_g = g_cost[current]
-        for neighbor, cost in grid_dict.get(current, []):
-            if neighbor in closed_list:
-                continue
-
-            new_g = current_g + cost
-            if neighbor not in g_cost or new_g < g_cost[neighbor]:
-                g_cost[neighbor] = new_g
-                f_cost = new_g + math.hypot(neighbor[0] - end_coord[0], neighbor[1] - end_coord[1])
-                heapq.heappush(open_list, (f_cost, neighbor))
-                came_from[neighbor] = current
-
-    return None  # No path found
+    if use_cache and not graph.astar.out_of_budget:
+        graph.path_cache.put(start_coord, end_coord, version, path)
+    return path
 
 # These 2 functions convert from grid coords to pygame coords
 def pygame_to_grid(pygame_coord: tuple, top_left: tuple, node_spacing: int):
@@ -0,0 +1,54 @@
+import math
+from collections import OrderedDict
+
+
+# Memoization of AI ray paths. Turret rays barely change between AI ticks, so the traced
+# path is reused while the (quantized) origin, angle, bounce count and wall set stay the same
+
+class RayCache:
+    """Bounded LRU cache of traced ray paths, shared by all AI tanks on a map"""
+
+    def __init__(self, max_size: int = 4096, pos_step: float = 2.0, angle_step: float = 0.25):
+        self.max_size = max_size
+        self.pos_step = pos_step        # Origin quantization in pixels
+        self.angle_step = angle_step    # Angle quantization in degrees
+        self.paths = OrderedDict()      # key -> list of ((x1, y1), (x2, y2)) segments, least recently used first
+
+        # Debug counters
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.paths)
+
+    def key(self, pos: tuple, angle: float, bounces: int, version: int) -> tuple:
+        """Quantized cache key. The ray should be traced from quantized_origin/quantized_angle of this key"""
+        angle_bins = round(360 / self.angle_step)
+        return (round(pos[0] / self.pos_step), round(pos[1] / self.pos_step),
+                round((angle % 360) / self.angle_step) % angle_bins, bounces, version)
+
+    def quantized_origin(self, key: tuple) -> tuple:
+        return key[0] * self.pos_step, key[1] * self.pos_step
+
+    def quantized_direction(self, key: tuple) -> tuple:
+        rads = math.radians(key[2] * self.angle_step)
+        return math.cos(rads), math.sin(rads)
+
+    def get(self, key: tuple) -> list | None:
+        path = self.paths.get(key)
+        if path is None:
+            self.misses += 1
+            return None
+        self.paths.move_to_end(key)
+        self.hits += 1
+        return path
+
+    def put(self, key: tuple, path: list) -> None:
+        self.paths[key] = path
+        self.paths.move_to_end(key)
+        if len(self.paths) > self.max_size:
+            self.paths.popitem(last=False)
+
+    def invalidate(self) -> None:
+        """Drops all paths (called when a destructible obstacle is removed)"""
+        self.paths.clear()
@@ -0,0 +1,80 @@
+import numpy as np
+from utils.ray_cache import RayCache
+from utils.threat_field import ThreatField
+from utils.bank_shot import BankShotSolver
+
+AI_OBSTACLE_TYPES = (0, 1)  # Standard and destructible obstacles block projectiles and rays (pits does not)
+TURRET_RAY_OFFSET = 30      # Turret rays start this far from the tank centre
+LINE_OF_SIGHT_INTERVAL = 60 # AI ticks between line of sight checks (see TankAI.misc_updates)
+
+
+# World level ray tracing. Before the AIs update, every ray they will ask for this tick is
+# collected and resolved in a few vectorized passes. The AIs then read the results instead
+# of tracing their rays one by one (falling back to their own tracing on a miss).
+
+class RayService:
+    def __init__(self, wall_index, ray_cache: RayCache | None = None):
+        self.wall_index = wall_index
+        self.ray_cache = ray_cache if ray_cache is not None else RayCache()
+
+        self.threat_field = ThreatField(wall_index, AI_OBSTACLE_TYPES)  # Predicted projectile paths (for dodging)
+        self.bank_shots = BankShotSolver(wall_index, AI_OBSTACLE_TYPES, muzzle_offset=TURRET_RAY_OFFSET)  # Ricochet firing angles
+        self.line_of_sight: dict[int, tuple[tuple, tuple, bool]] = {} # tank id -> (start, end, no wall in between)
+
+    def prepare(self, ais: list, projectile_pool) -> None:
+        """Resolves the turret rays, projectile predictions and line of sight checks of this tick"""
+        self.prepare_turret_rays(ais)
+        self.threat_field.update(projectile_pool)
+        self.prepare_line_of_sight(ais)
+
+    def prepare_turret_rays(self, ais: list) -> None:
+        """Traces the turret rays missing from the ray cache (only for AIs that may shoot)"""
+        version = self.wall_index.version
+        pending = {}
+        for ai in ais:
+            if ai.targeted_unit is None or ai.salvo_cooldown > 0:
+                continue
+            key = self.ray_cache.key(ai.tank.pos, ai.tank.turret_rotation_angle, ai.max_bounces, version)
+            if key not in self.ray_cache.paths:
+                pending[key] = ai.max_bounces
+
+        if not pending:
+            return
+
+        keys = list(pending)
+        directions = np.array([self.ray_cache.quantized_direction(key) for key in keys])
+        origins = np.array([self.ray_cache.quantized_origin(key) for key in keys]) + directions * TURRET_RAY_OFFSET
+        paths = self.wall_index.trace_paths(origins, directions, np.array(list(pending.values())), AI_OBSTACLE_TYPES)
+
+        for key, path in zip(keys, paths):
+            self.ray_cache.put(key, path)
+
+    def prepare_line_of_sight(self, ais: list) -> None:
+        """Checks for walls between each AI and its target, for the AIs whose hit scan the scheduler makes due
+        this tick or that still wait for AI budget"""
+        self.line_of_sight = {}
+        due = [ai for ai in ais if ai.targeted_unit is not None
+               and (ai.hit_scan_due or ai.scheduler.due_next(ai, LINE_OF_SIGHT_INTERVAL))]
+        if not due:
+            return
+
+        starts = np.array([ai.tank.pos for ai in due], dtype=np.float64)
+        ends = np.array([ai.targeted_unit.pos for ai in due], dtype=np.float64)
+        edge_index, _, _ = self.wall_index.first_hits(starts, ends, AI_OBSTACLE_TYPES)
+
+        for ai, start, end, blocked in zip(due, starts.tolist(), ends.tolist(), (edge_index >= 0).tolist()):
+            self.line_of_sight[ai.tank.id] = (tuple(start), tuple(end), not blocked)
+
+    def projectile_path(self, proj) -> list | None:
+        """Predicted remaining path of the projectile as ((x1, y1), (x2, y2)) segments"""
+        segments = self.threat_field.path(proj.index)
+        if segments is None:
+            return None
+        return [((x1, y1), (x2, y2)) for x1, y1, x2, y2 in segments.tolist()]
+
+    def wall_free(self, tank_id: int, start: tuple, end: tuple) -> bool | None:
+        """Result of this tick's line of sight check, None if it was not prepared for this segment"""
+        cached = self.line_of_sight.get(tank_id)
+        if cached is None or cached[0] != tuple(start) or cached[1] != tuple(end):
+            return None
+        return cached[2]
@@ -0,0 +1,407 @@
+import math
+import numpy as np
+from collections import defaultdict
+import utils.batch_geometry as batch_geometry
+from utils import line_intersection
+
+
+# Spatial lookup structures shared by the collision and ray queries
+
+EDGE_PAD = 1.0              # Edges lying on a cell border are added to both neighbour cells
+SHORT_SEGMENT_CELLS = 2     # first_hits prunes by grid cell only for segments spanning at most this many extra cells per axis
+
+def segment_cells(x1: float, y1: float, x2: float, y2: float, cell_size: float) -> list[tuple[int, int]]:
+    """Grid cells crossed by the segment (grid traversal)"""
+    cs = cell_size
+    cx, cy = math.floor(x1 / cs), math.floor(y1 / cs)
+    end_cx, end_cy = math.floor(x2 / cs), math.floor(y2 / cs)
+    dx, dy = x2 - x1, y2 - y1
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+    t_max_x = ((cx + (step_x > 0)) * cs - x1) / dx if dx != 0 else math.inf
+    t_max_y = ((cy + (step_y > 0)) * cs - y1) / dy if dy != 0 else math.inf
+    t_delta_x = cs / abs(dx) if dx != 0 else math.inf
+    t_delta_y = cs / abs(dy) if dy != 0 else math.inf
+
+    cells = [(cx, cy)]
+    for _ in range(abs(end_cx - cx) + abs(end_cy - cy)):
+        if t_max_x < t_max_y:
+            cx += step_x
+            t_max_x += t_delta_x
+        else:
+            cy += step_y
+            t_max_y += t_delta_y
+        cells.append((cx, cy))
+    return cells
+
+
+class EdgeGrid:
+    """Uniform grid over all obstacle edges. Built once per map in load_map, so a query only looks at
+    the edges in the cells it touches instead of every edge on the map: box queries for the tank
+    collisions, and segment queries (first_hits, trace_paths, nearest_hit) for the projectile sweeps
+    and the ray casts. Edge indices returned by the segment queries are rows of edge_array(types)."""
+
+    def __init__(self, obstacles: list, cell_size: int = 100):
+        self.cell_size = cell_size
+        self.cells = defaultdict(list)  # (cell_x, cell_y) -> list of edge ids
+        self.edges = []                 # edge id -> ((x1, y1), (x2, y2)). None when removed
+        self.edge_types = []            # edge id -> obstacle type (0: standard, 1: destructible, 2: pit)
+        self.edge_normals = []          # edge id -> outward unit normal of the obstacle edge
+        self.obstacle_edges = {}        # obstacle id -> list of edge ids
+        self.version = 0                # Bumped every time the edge set changes
+        self.bounds = None              # (min_x, min_y, max_x, max_y) of all edges ever added, segments are clipped to it
+        self._edge_arrays = {}          # types -> (version, edges, normals, cell -> rows, cell ranges) used by the segment queries
+
+        for obstacle in obstacles:
+            self.add_obstacle(obstacle)
+
+    def _cell_range(self, min_x: float, min_y: float, max_x: float, max_y: float) -> tuple:
+        cs = self.cell_size
+        return (int(math.floor(min_x / cs)), int(math.floor(min_y / cs)),
+                int(math.floor(max_x / cs)), int(math.floor(max_y / cs)))
+
+    def add_obstacle(self, obstacle) -> None:
+        """Adds all edges of an obstacle to the grid"""
+        edge_ids = []
+        pad = EDGE_PAD
+
+        for (start, end), normal, length in zip(obstacle.get_corner_pairs(), obstacle.normals, obstacle.edge_lengths):
+            if length == 0:
+                continue  # Zero length edges can't be hit
+            edge_id = len(self.edges)
+            self.edges.append((start, end))
+            self.edge_types.append(obstacle.obstacle_type)
+            self.edge_normals.append((float(normal[0]), float(normal[1])))
+            edge_ids.append(edge_id)
+            self._extend_bounds(start, end)
+
+            min_cx, min_cy, max_cx, max_cy = self._cell_range(min(start[0], end[0]) - pad, min(start[1], end[1]) - pad,
+                                                              max(start[0], end[0]) + pad, max(start[1], end[1]) + pad)
+            for cx in range(min_cx, max_cx + 1):
+                for cy in range(min_cy, max_cy + 1):
+                    self.cells[(cx, cy)].append(edge_id)
+
+        self.obstacle_edges[obstacle.id] = edge_ids
+        self.version += 1
+
+    def _extend_bounds(self, start: tuple, end: tuple) -> None:
+        min_x, max_x = min(start[0], end[0]), max(start[0], end[0])
+        min_y, max_y = min(start[1], end[1]), max(start[1], end[1])
+        if self.bounds is not None:
+            min_x, min_y = min(min_x, self.bounds[0]), min(min_y, self.bounds[1])
+            max_x, max_y = max(max_x, self.bounds[2]), max(max_y, self.bounds[3])
+        self.bounds = (min_x, min_y, max_x, max_y)
+
+    def remove_obstacle(self, obstacle) -> None:
+        """Removes the edges of an obstacle (used when a mine destroys a destructible obstacle)"""
+        edge_ids = self.obstacle_edges.pop(obstacle.id, None)
+        if not edge_ids:
+            return
+
+        removed = set(edge_ids)
+        for key in list(self.cells.keys()):
+            cell = self.cells[key]
+            if removed.intersection(cell):
+                self.cells[key] = [edge_id for edge_id in cell if edge_id not in removed]
+
+        for edge_id in edge_ids:
+            self.edges[edge_id] = None
+
+        self.version += 1
+
+    def edge_array(self, types: tuple | None = None) -> np.ndarray:
+        """Returns all current edges of the given obstacle types as a (m, 4) float array of x1, y1, x2, y2"""
+        return self._arrays(types)[1]
+
+    def normal_array(self, types: tuple | None = None) -> np.ndarray:
+        """Returns the outward unit normals (m, 2) matching the rows of edge_array(types)"""
+        return self._arrays(types)[2]
+
+    def _arrays(self, types: tuple | None) -> tuple:
+        cached = self._edge_arrays.get(types)
+        if cached is not None and cached[0] == self.version:
+            return cached
+
+        ids = [edge_id for edge_id, (edge, edge_type) in enumerate(zip(self.edges, self.edge_types))
+               if edge is not None and (types is None or edge_type in types)]
+        edges = np.array([(*self.edges[i][0], *self.edges[i][1]) for i in ids], dtype=np.float64).reshape(-1, 4)
+        normals = np.array([self.edge_normals[i] for i in ids], dtype=np.float64).reshape(-1, 2)
+
+        # Rows of the edges in each cell, so a segment query doesn't map edge ids to rows itself
+        row_of = {edge_id: row for row, edge_id in enumerate(ids)}
+        cell_rows = {}
+        for cell, edge_ids in self.cells.items():
+            rows = [row_of[edge_id] for edge_id in edge_ids if edge_id in row_of]
+            if rows:
+                cell_rows[cell] = rows
+
+        # (m, 4) cell range min_cx, min_cy, max_cx, max_cy of each row, the cells it was added to
+        lo = np.floor((np.minimum(edges[:, 0:2], edges[:, 2:4]) - EDGE_PAD) / self.cell_size)
+        hi = np.floor((np.maximum(edges[:, 0:2], edges[:, 2:4]) + EDGE_PAD) / self.cell_size)
+        cell_ranges = np.hstack((lo, hi))
+
+        cached = (self.version, edges, normals, cell_rows, cell_ranges)
+        self._edge_arrays[types] = cached
+        return cached
+
+    def _clip(self, x1: float, y1: float, x2: float, y2: float) -> tuple | None:
+        """The part of the segment inside the edge bounds (padded by one pixel), None if it is outside"""
+        if self.bounds is None:
+            return None
+        t0, t1 = 0.0, 1.0
+        dx, dy = x2 - x1, y2 - y1
+        min_x, min_y, max_x, max_y = self.bounds
+        for p, q in ((-dx, x1 - min_x + 1), (dx, max_x + 1 - x1), (-dy, y1 - min_y + 1), (dy, max_y + 1 - y1)):
+            if p == 0:
+                if q < 0:
+                    return None
+                continue
+            t = q / p
+            if p < 0:
+                t0 = max(t0, t)
+            else:
+                t1 = min(t1, t)
+        if t0 > t1:
+            return None
+        return x1 + dx * t0, y1 + dy * t0, x1 + dx * t1, y1 + dy * t1
+
+    def segment_rows(self, x1: float, y1: float, x2: float, y2: float, types: tuple | None = None) -> list:
+        """Rows of edge_array(types) in the cells crossed by the segment (an edge spanning several cells is listed once per cell)"""
+        clipped = self._clip(x1, y1, x2, y2)
+        if clipped is None:
+            return []
+        cell_rows = self._arrays(types)[3]
+        rows = []
+        for cell in segment_cells(*clipped, self.cell_size):
+            rows.extend(cell_rows.get(cell, ()))
+        return rows
+
+    def first_hits(self, starts: np.ndarray, ends: np.ndarray, types: tuple | None = None,
+                   skip: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """batch_geometry.first_hits where short segments only test the edges sharing a grid cell with their
+        cell box, long rays test every edge.
+
+        Args:
+            starts (np.ndarray): (n, 2) segment start points
+            ends (np.ndarray): (n, 2) segment end points
+            types (tuple | None): obstacle types to test against
+            skip (np.ndarray | None): optional (n,) row of edge_array(types) ignored per segment, -1 for none
+
+        Returns:
+            np.ndarray: (n,) row of the first edge hit in edge_array(types), -1 if no hit
+            np.ndarray: (n, 2) hit points (undefined where there is no hit)
+            np.ndarray: (n, 2) unit normals of the hit edges facing the incoming segment
+        """
+        _, edges, normals, _, cell_ranges = self._arrays(types)
+        n = len(starts)
+        starts = np.asarray(starts, dtype=np.float64).reshape(-1, 2)
+        ends = np.asarray(ends, dtype=np.float64).reshape(-1, 2)
+
+        # Short segments (the projectile sweeps) only test the edges sharing a cell with their cell box.
+        # A long ray's box covers most of the map, there the box test would cost more than it prunes
+        lo = np.floor(np.minimum(starts, ends) / self.cell_size)
+        hi = np.floor(np.maximum(starts, ends) / self.cell_size)
+        short = np.flatnonzero(np.all(hi - lo <= SHORT_SEGMENT_CELLS, axis=1))
+        mask = None
+        if skip is not None:
+            mask = np.arange(len(edges))[None, :] != np.asarray(skip)[:, None]
+        if len(short) == 0:
+            return batch_geometry.first_hits(starts, ends, edges, mask, normals)
+
+        if mask is None:
+            mask = np.ones((n, len(edges)), dtype=bool)
+        mask[short] &= self._box_overlap(lo[short], hi[short], cell_ranges)
+
+        candidates = np.flatnonzero(mask.any(axis=0))
+        if len(candidates) == 0:
+            return np.full(n, -1, dtype=np.int64), np.zeros((n, 2)), np.zeros((n, 2))
+
+        edge_index, points, hit_normals = batch_geometry.first_hits(starts, ends, edges[candidates], mask[:, candidates], normals[candidates])
+        hit = edge_index >= 0
+        edge_index[hit] = candidates[edge_index[hit]]
+        return edge_index, points, hit_normals
+
+    @staticmethod
+    def _box_overlap(lo: np.ndarray, hi: np.ndarray, cell_ranges: np.ndarray) -> np.ndarray:
+        """(n, m) True where the cell box lo..hi of a segment overlaps the cell range of an edge"""
+        return ((lo[:, None, 0] <= cell_ranges[None, :, 2]) & (hi[:, None, 0] >= cell_ranges[None, :, 0])
+                & (lo[:, None, 1] <= cell_ranges[None, :, 3]) & (hi[:, None, 1] >= cell_ranges[None, :, 1]))
+
+    def trace_paths(self, origins: np.ndarray, directions: np.ndarray, bounces: np.ndarray, types: tuple | None = None,
+                    max_distance: float = 2000) -> list[list[tuple]]:
+        """Traces many bouncing rays at once, one first_hits call per bounce level.
+
+        Args:
+            origins (np.ndarray): (n, 2) ray start points
+            directions (np.ndarray): (n, 2) unit ray directions
+            bounces (np.ndarray): (n,) bounces per ray (a ray has at most bounces + 1 segments, none if negative)
+            types (tuple | None): obstacle types the rays bounce on
+            max_distance (float): length of a segment that doesn't hit anything
+
+        Returns:
+            list[list[tuple]]: per ray the segments ((x1, y1), (x2, y2)) in path order
+        """
+        n = len(origins)
+        paths = [[] for _ in range(n)]
+        points = np.array(origins, dtype=np.float64).reshape(-1, 2)
+        dirs = np.array(directions, dtype=np.float64).reshape(-1, 2)
+        remaining = np.array(bounces, dtype=np.int64).reshape(-1)
+        last_edge = np.full(n, -1, dtype=np.int64)     # Edge bounced on last, skipped in the next pass
+
+        active = np.flatnonzero(remaining >= 0)
+        while len(active):
+            starts = points[active]
+            ends = starts + dirs[active] * max_distance
+
+            edge_index, hit_points, hit_normals = self.first_hits(starts, ends, types, last_edge[active])
+            hit = edge_index >= 0
+            seg_ends = np.where(hit[:, None], hit_points, ends)
+
+            for row, start, end in zip(active.tolist(), starts.tolist(), seg_ends.tolist()):
+                paths[row].append((tuple(start), tuple(end)))
+
+            # Rays that hit a wall and have bounces left continue in the reflected direction
+            keep = np.flatnonzero(hit & (remaining[active] > 0))
+            rows = active[keep]
+            dirs[rows] = batch_geometry.reflect(dirs[rows], hit_normals[keep])
+            points[rows] = hit_points[keep] + dirs[rows] * 0.1     # Slightly off the wall
+            last_edge[rows] = edge_index[keep]
+            remaining[rows] -= 1
+            active = rows
+
+        return paths
+
+    def nearest_hit(self, x1: float, y1: float, x2: float, y2: float, types: tuple | None = None,
+                    min_dist: float = 0.0) -> tuple[float, float, int, float]:
+        """line_intersection.nearest_hit over the edges in the cells crossed by the segment.
+
+        Returns:
+            tuple: (px, py, row of the edge in edge_array(types), distance). The row is -1 when nothing is hit
+        """
+        rows = self.segment_rows(x1, y1, x2, y2, types)
+        if not rows:
+            return -1.0, -1.0, -1, math.inf
+        edges = np.ascontiguousarray(self._arrays(types)[1][rows])
+        px, py, index, dist = line_intersection.nearest_hit(x1, y1, x2, y2, edges, min_dist)
+        return px, py, (rows[index] if index >= 0 else -1), dist
+
+    def _collect_ids(self, cells, types) -> list:
+        seen = set()
+        result = []
+        for cell in cells:
+            for edge_id in self.cells.get(cell, ()):
+                if edge_id in seen:
+                    continue
+                seen.add(edge_id)
+                if types is None or self.edge_types[edge_id] in types:
+                    result.append(edge_id)
+        return result
+
+    def query_box_ids(self, min_x: float, min_y: float, max_x: float, max_y: float, types: tuple | None = None) -> list:
+        """Returns the ids of the edges in the cells overlapped by the box (look up edges/edge_normals by id)"""
+        min_cx, min_cy, max_cx, max_cy = self._cell_range(min_x, min_y, max_x, max_y)
+        cells = [(cx, cy) for cx in range(min_cx, max_cx + 1) for cy in range(min_cy, max_cy + 1)]
+        return self._collect_ids(cells, types)
+
+
+class SpatialHash:
+    """Uniform hash of moving points (tanks, projectiles). Objects are stored by key and can be
+    inserted, moved and removed, so the hash can be rebuilt every tick or kept up to date incrementally."""
+
+    # Half of the neighbour cells, so every pair of cells is only visited once
+    FORWARD_NEIGHBOURS = ((1, -1), (1, 0), (1, 1), (0, 1))
+
+    def __init__(self, cell_size: float = 50):
+        self.cell_size = cell_size
+        self.cells = defaultdict(dict)  # (cell_x, cell_y) -> keys (dict used as an insertion ordered set)
+        self.positions = {}             # key -> (x, y)
+        self.key_cells = {}             # key -> (cell_x, cell_y)
+
+    def __len__(self):
+        return len(self.positions)
+
+    def _cell(self, x: float, y: float) -> tuple:
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def clear(self) -> None:
+        self.cells.clear()
+        self.positions.clear()
+        self.key_cells.clear()
+
+    def insert(self, key, pos: tuple) -> None:
+        cell = self._cell(pos[0], pos[1])
+        self.cells[cell][key] = None
+        self.positions[key] = (pos[0], pos[1])
+        self.key_cells[key] = cell
+
+    def remove(self, key) -> None:
+        cell = self.key_cells.pop(key, None)
+        if cell is None:
+            return
+        del self.positions[key]
+        bucket = self.cells[cell]
+        bucket.pop(key, None)
+        if not bucket:
+            del self.cells[cell]
+
+    def move(self, key, pos: tuple) -> None:
+        """Updates the position of a key, only touching the buckets if it changed cell"""
+        cell = self._cell(pos[0], pos[1])
+        old_cell = self.key_cells.get(key)
+        self.positions[key] = (pos[0], pos[1])
+        if cell == old_cell:
+            return
+        if old_cell is not None:
+            bucket = self.cells[old_cell]
+            bucket.pop(key, None)
+            if not bucket:
+                del self.cells[old_cell]
+        self.cells[cell][key] = None
+        self.key_cells[key] = cell
+
+    def query_radius(self, pos: tuple, radius: float) -> list:
+        """Returns the keys within radius of pos"""
+        x, y = pos
+        min_cx, min_cy = self._cell(x - radius, y - radius)
+        max_cx, max_cy = self._cell(x + radius, y + radius)
+        radius_sq = radius * radius
+
+        result = []
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                for key in self.cells.get((cx, cy), ()):
+                    px, py = self.positions[key]
+                    if (px - x)**2 + (py - y)**2 <= radius_sq:
+                        result.append(key)
+        return result
+
+    def pairs(self, radius: float) -> list:
+        """Returns every unique pair of keys closer than radius (radius must not exceed the cell size)"""
+        radius_sq = radius * radius
+        positions = self.positions
+        result = []
+
+        for (cx, cy), bucket in self.cells.items():
+            keys = list(bucket)
+
+            # Pairs inside the cell
+            for i, key_a in enumerate(keys):
+                ax, ay = positions[key_a]
+                for key_b in keys[i + 1:]:
+                    bx, by = positions[key_b]
+                    if (ax - bx)**2 + (ay - by)**2 <= radius_sq:
+                        result.append((key_a, key_b))
+
+            # Pairs with the forward neighbour cells
+            for dx, dy in self.FORWARD_NEIGHBOURS:
+                neighbour = self.cells.get((cx + dx, cy + dy))
+                if not neighbour:
+                    continue
+                for key_a in keys:
+                    ax, ay = positions[key_a]
+                    for key_b in neighbour:
+                        bx, by = positions[key_b]
+                        if (ax - bx)**2 + (ay - by)**2 <= radius_sq:
+                            result.append((key_a, key_b))
+
+        return result
@@ -0,0 +1,142 @@
+import math
+import numpy as np
+from collections import defaultdict
+from utils.spatial_index import segment_cells
+
+
+# Predicted projectile paths shared by all AIs for dodging. A projectile's bounce path is traced once
+# when it is fired and again after each bounce (not per AI and tick), and its segments are kept in a
+# uniform grid, so an AI only looks at the paths crossing the cells around it.
+
+class ThreatField:
+    def __init__(self, wall_index, edge_types: tuple, cell_size: int = 100):
+        self.wall_index = wall_index
+        self.edge_types = edge_types
+        self.cell_size = cell_size
+
+        self.keys = {}                  # slot -> (bounce count, leg start, direction, wall version) the path was traced for
+        self.paths = {}                 # slot -> (k, 4) path segments, the first one starting at the leg start
+        self.slot_cells = {}            # slot -> cells crossed by its path
+        self.cells = defaultdict(set)   # (cell_x, cell_y) -> slots whose path crosses the cell
+        self.positions = {}             # slot -> current projectile position (start of its live path)
+
+        # Debug counter
+        self.traced = 0
+
+    def update(self, pool) -> None:
+        """Syncs the field with the projectile pool. Only projectiles that were fired or bounced since the
+        last update (or all, if the walls changed) are traced"""
+        slots = np.flatnonzero(pool.alive)
+        version = self.wall_index.version
+
+        alive = set(slots.tolist())
+        for slot in [slot for slot in self.paths if slot not in alive]:
+            self.remove(slot)
+
+        stale = []
+        for slot, bounce_count, leg_start, direction in zip(slots.tolist(), pool.bounce_count[slots].tolist(), pool.startpos[slots].tolist(), pool.direction[slots].tolist()):
+            key = (bounce_count, tuple(leg_start), tuple(direction), version)  # Slots are reused, so a new projectile gets a new key
+            if self.keys.get(slot) != key:
+                self.keys[slot] = key
+                stale.append(slot)
+
+        if stale:
+            stale = np.array(stale)
+            directions = pool.direction[stale]
+            origins = pool.startpos[stale] + directions     # 1 px off the wall it bounced on
+            bounces = pool.bounce_limit[stale] - pool.bounce_count[stale] - 1
+            for slot, path in zip(stale.tolist(), self.wall_index.trace_paths(origins, directions, bounces, self.edge_types)):
+                self.set_path(slot, np.array([(*start, *end) for start, end in path], dtype=np.float64).reshape(-1, 4))
+            self.traced += len(stale)
+
+        self.positions = dict(zip(slots.tolist(), map(tuple, pool.pos[slots].tolist())))
+
+    def set_path(self, slot: int, segments: np.ndarray) -> None:
+        self.remove_cells(slot)
+        self.paths[slot] = segments
+        cells = set()
+        for x1, y1, x2, y2 in segments.tolist():
+            cells.update(segment_cells(x1, y1, x2, y2, self.cell_size))
+        self.slot_cells[slot] = cells
+        for cell in cells:
+            self.cells[cell].add(slot)
+
+    def remove(self, slot: int) -> None:
+        self.remove_cells(slot)
+        self.paths.pop(slot, None)
+        self.keys.pop(slot, None)
+        self.positions.pop(slot, None)
+
+    def remove_cells(self, slot: int) -> None:
+        for cell in self.slot_cells.pop(slot, ()):
+            slots = self.cells[cell]
+            slots.discard(slot)
+            if not slots:
+                del self.cells[cell]
+
+    def clear(self) -> None:
+        self.keys.clear()
+        self.paths.clear()
+        self.slot_cells.clear()
+        self.cells.clear()
+        self.positions.clear()
+
+    def path(self, slot: int) -> np.ndarray | None:
+        """Remaining path of the projectile in slot, the first segment starting at its current position"""
+        segments = self.paths.get(slot)
+        if segments is None:
+            return None
+        segments = segments.copy()
+        if len(segments):
+            segments[0, 0:2] = self.positions[slot]
+        return segments
+
+    def nearest_threat(self, pos: tuple, radius: float, first_leg_only: bool = False) -> tuple[int, float, tuple] | None:
+        """Closest predicted path within radius that moves toward pos (within ~72 degrees).
+
+        Returns:
+            tuple | None: (slot, distance, unit direction of the closest segment), None if no path is that close
+        """
+        cs = self.cell_size
+        min_cx, min_cy = math.floor((pos[0] - radius) / cs), math.floor((pos[1] - radius) / cs)
+        max_cx, max_cy = math.floor((pos[0] + radius) / cs), math.floor((pos[1] + radius) / cs)
+        slots = set()
+        for cx in range(min_cx, max_cx + 1):
+            for cy in range(min_cy, max_cy + 1):
+                slots.update(self.cells.get((cx, cy), ()))
+        if not slots:
+            return None
+
+        segment_slots = []
+        segments = []
+        for slot in slots:
+            path = self.path(slot)
+            if first_leg_only:
+                path = path[:1]
+            segments.append(path)
+            segment_slots.extend([slot] * len(path))
+        segments = np.vstack(segments)
+        if len(segments) == 0:
+            return None
+
+        starts = segments[:, 0:2]
+        vectors = segments[:, 2:4] - starts
+        to_point = np.asarray(pos, dtype=np.float64) - starts
+        lengths = np.hypot(vectors[:, 0], vectors[:, 1])
+        to_point_lengths = np.hypot(to_point[:, 0], to_point[:, 1])
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Moving toward the point
+            facing = np.sum(vectors * to_point, axis=1) / (lengths * to_point_lengths) >= 0.3
+
+            # Point to segment distance
+            t = np.clip(np.sum(to_point * vectors, axis=1) / lengths**2, 0.0, 1.0)
+        closest = starts + vectors * t[:, None]
+        dist = np.hypot(pos[0] - closest[:, 0], pos[1] - closest[:, 1])
+        dist[~facing | (lengths == 0) | (to_point_lengths == 0)] = np.inf
+
+        best = int(np.argmin(dist))
+        if dist[best] > radius:
+            return None
+        direction = (float(vectors[best, 0] / lengths[best]), float(vectors[best, 1] / lengths[best]))
+        return segment_slots[best], float(dist[best]), direction
@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+# The game modules import each other as utils.* and object_classes.* (python -m tankgame puts tankgame/ on the path)
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "tankgame")))
+
+
+class Box:
+    """Axis aligned square obstacle with the attributes EdgeGrid reads from an Obstacle"""
+
+    def __init__(self, obstacle_id: int, x: float, y: float, size: float, obstacle_type: int = 0):
+        corners = [(x, y), (x + size, y), (x + size, y + size), (x, y + size)]
+        self.id = obstacle_id
+        self.obstacle_type = obstacle_type
+        self.corners = corners
+        self.corner_pairs = [(corners[i], corners[(i + 1) % 4]) for i in range(4)]
+        self.normals = [(0.0, -1.0), (1.0, 0.0), (0.0, 1.0), (-1.0, 0.0)]
+        self.edge_lengths = [size] * 4
+        self.aabb = (x, y, x + size, y + size)
+
+    def get_corner_pairs(self):
+        return self.corner_pairs
+
+
+@pytest.fixture
+def boxes():
+    """A 1000 x 1000 px field with a few scattered boxes over several grid cells"""
+    return [Box(0, 120, 130, 60), Box(1, 400, 380, 150), Box(2, 710, 90, 40, obstacle_type=1),
+            Box(3, 240, 640, 90), Box(4, 620, 700, 200), Box(5, 0, 0, 1000)]
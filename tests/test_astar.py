@@ -0,0 +1,58 @@
+import os
+import random
+import numpy as np
+import path_benchmark
+import utils.pathfinding as pathfinding
+from utils.nav_graph import NavGraph
+
+
+def random_grid(seed: int, width: int = 30, height: int = 20, blocked: float = 0.3) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    return (rng.random((height, width)) < blocked).astype(np.int64)
+
+
+def grid_dict(graph: NavGraph) -> dict:
+    """The tuple keyed neighbour dict the old find_path searched"""
+    return {graph.cell(node_id): graph.neighbors(node_id) for node_id in range(len(graph))}
+
+
+def free_cells(graph: NavGraph) -> list[tuple[int, int]]:
+    return [graph.cell(node_id) for node_id in range(len(graph)) if not graph.blocked.flat[node_id]]
+
+
+def test_astar_matches_old_find_path_cost():
+    rng = random.Random(0)
+    for seed in range(5):
+        graph = NavGraph(random_grid(seed))
+        reference = grid_dict(graph)
+        cells = free_cells(graph)
+        for _ in range(40):
+            start, goal = rng.choice(cells), rng.choice(cells)
+            graph.path_cache.invalidate()
+
+            path = pathfinding.find_path(graph, start, goal)
+            expected = path_benchmark.reference_find_path(reference, start, goal)
+
+            assert (path is None) == (expected is None)
+            if path is not None:
+                assert abs(path_benchmark.path_cost(path) - path_benchmark.path_cost(expected)) < 1e-6
+                assert path[0] == start and path[-1] == goal
+
+
+def test_astar_paths_only_step_to_free_neighbours():
+    graph = NavGraph(random_grid(7))
+    cells = free_cells(graph)
+    rng = random.Random(1)
+    for _ in range(40):
+        path = pathfinding.find_path(graph, rng.choice(cells), rng.choice(cells))
+        if path is None:
+            continue
+        for a, b in zip(path, path[1:]):
+            assert b in dict(graph.neighbors(graph.node_id(a)))
+            assert not graph.blocked[b[1], b[0]]
+
+
+def test_astar_matches_old_find_path_on_a_map():
+    map_path = os.path.join(path_benchmark.MAP_DIR, "lvl12.txt")
+    _, _, mismatches = path_benchmark.benchmark_map(map_path, 30, random.Random(0))
+    assert mismatches == 0
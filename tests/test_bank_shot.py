@@ -0,0 +1,54 @@
+import math
+import numpy as np
+import utils.batch_geometry as batch_geometry
+from utils.bank_shot import BankShotSolver
+from utils.spatial_index import EdgeGrid
+
+ORIGIN = (200.0, 460.0)
+TARGET = (800.0, 460.0)     # Box 1 is in the way of the direct shot
+
+
+def path_passes(wall_index: EdgeGrid, angle: float, point: tuple, threshold: float, bounces: int) -> bool:
+    rads = math.radians(angle)
+    direction = np.array([[math.cos(rads), math.sin(rads)]])
+    path = wall_index.trace_paths(np.array([ORIGIN]) + direction * 30, direction, np.array([bounces]))[0]
+    segments = np.array([(*start, *end) for start, end in path])
+    return bool(batch_geometry.points_near_segments(segments, np.array([point]), np.array([threshold])).any())
+
+
+def test_solved_angles_hit_the_target_around_a_wall(boxes):
+    wall_index = EdgeGrid(boxes)
+    solver = BankShotSolver(wall_index, (0, 1), cell_size=20.0)
+
+    angles = solver.solve(ORIGIN, TARGET, [], bounces=1, shoot_threshold=15, safe_threshold=60)
+
+    assert len(angles) > 0
+    assert not any(abs((angle + 180) % 360 - 180) < 1 for angle in angles)   # Not the blocked straight shot
+    for angle in angles:
+        assert path_passes(wall_index, angle, TARGET, 15 + solver.cell_size, bounces=1)
+
+
+def test_angles_passing_a_blocker_are_dropped(boxes):
+    wall_index = EdgeGrid(boxes)
+    solver = BankShotSolver(wall_index, (0, 1), cell_size=20.0)
+    angles = solver.solve(ORIGIN, TARGET, [], bounces=1, shoot_threshold=15, safe_threshold=60)
+    rads = math.radians(angles[0])
+    blocker = (ORIGIN[0] + math.cos(rads) * 150, ORIGIN[1] + math.sin(rads) * 150)
+
+    safe = solver.solve(ORIGIN, TARGET, [blocker], bounces=1, shoot_threshold=15, safe_threshold=60)
+
+    assert angles[0] not in safe
+    assert len(safe) < len(angles)
+    assert solver.hits == 1 and solver.fans_traced == 1     # Second solve reused the fan and the candidates
+
+
+def test_walls_changing_retraces_the_fan(boxes):
+    wall_index = EdgeGrid(boxes)
+    solver = BankShotSolver(wall_index, (0, 1), cell_size=20.0)
+    solver.solve(ORIGIN, TARGET, [], bounces=1, shoot_threshold=15, safe_threshold=60)
+
+    wall_index.remove_obstacle(boxes[1])
+    angles = solver.solve(ORIGIN, TARGET, [], bounces=1, shoot_threshold=15, safe_threshold=60)
+
+    assert solver.fans_traced == 2
+    assert any(abs((angle + 180) % 360 - 180) < 1 for angle in angles)   # Straight shot is open now
@@ -0,0 +1,102 @@
+import math
+import numpy as np
+import utils.batch_geometry as batch_geometry
+from utils import line_intersection
+from utils.spatial_index import EdgeGrid
+
+
+def reference_hit(start: tuple, end: tuple, edges: np.ndarray, min_dist: float = 0.0) -> tuple | None:
+    """Nearest hit point by testing every edge with the scalar line_intersection"""
+    best, best_dist = None, math.inf
+    for x3, y3, x4, y4 in edges.tolist():
+        px, py = line_intersection.line_intersection(*start, *end, x3, y3, x4, y4)
+        if (px, py) == (-1.0, -1.0):
+            continue
+        dist = math.hypot(px - start[0], py - start[1])
+        if min_dist < dist < best_dist:
+            best, best_dist = (px, py), dist
+    return best
+
+
+def random_segments(count: int, seed: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    starts = rng.uniform(-50, 1050, (count, 2))
+    ends = starts + rng.uniform(-600, 600, (count, 2))
+    return starts, ends
+
+
+def assert_matches_reference(starts, ends, edges, edge_index, points):
+    for row, (start, end) in enumerate(zip(starts.tolist(), ends.tolist())):
+        expected = reference_hit(start, end, edges)
+        if expected is None:
+            assert edge_index[row] == -1
+        else:
+            assert edge_index[row] >= 0
+            assert np.allclose(points[row], expected, atol=1e-6)
+
+
+def test_first_hits_matches_scalar_line_intersection(boxes):
+    edges = EdgeGrid(boxes).edge_array()
+    starts, ends = random_segments(400)
+
+    edge_index, points, _ = batch_geometry.first_hits(starts, ends, edges)
+
+    assert_matches_reference(starts, ends, edges, edge_index, points)
+
+
+def test_first_hits_normals_face_the_segment(boxes):
+    grid = EdgeGrid(boxes)
+    starts, ends = random_segments(200, seed=1)
+
+    edge_index, _, normals = batch_geometry.first_hits(starts, ends, grid.edge_array(), edge_normals=grid.normal_array())
+
+    hit = edge_index >= 0
+    assert hit.any()
+    assert (np.einsum("ij,ij->i", normals[hit], ends[hit] - starts[hit]) < 0).all()
+
+
+def test_grid_first_hits_matches_all_edges(boxes):
+    grid = EdgeGrid(boxes)
+    starts, ends = random_segments(400, seed=2)
+
+    edge_index, points, _ = grid.first_hits(starts, ends, types=(0, 1))
+
+    assert_matches_reference(starts, ends, grid.edge_array(types=(0, 1)), edge_index, points)
+
+
+def test_grid_first_hits_skips_the_given_edge(boxes):
+    grid = EdgeGrid(boxes)
+    edges = grid.edge_array()
+    starts = np.array([[300.0, 160.0]])
+    ends = np.array([[0.0, 160.0]])     # Crosses the right then the left side of box 0
+
+    first, _, _ = grid.first_hits(starts, ends)
+    second, points, _ = grid.first_hits(starts, ends, skip=first)
+
+    assert first[0] >= 0 and second[0] >= 0 and second[0] != first[0]
+    assert np.allclose(points[0], (120.0, 160.0))
+    assert tuple(edges[second[0]]) in {(120.0, 190.0, 120.0, 130.0), (120.0, 130.0, 120.0, 190.0)}
+
+
+def test_grid_nearest_hit_matches_scalar_line_intersection(boxes):
+    grid = EdgeGrid(boxes)
+    edges = grid.edge_array(types=(0,))
+    starts, ends = random_segments(300, seed=3)
+
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        px, py, index, _ = grid.nearest_hit(*start, *end, types=(0,), min_dist=1.0)
+        expected = reference_hit(start, end, edges, min_dist=1.0)
+        if expected is None:
+            assert index == -1
+        else:
+            assert index >= 0
+            assert math.isclose(px, expected[0], abs_tol=1e-6) and math.isclose(py, expected[1], abs_tol=1e-6)
+
+
+def test_removed_obstacle_is_not_hit(boxes):
+    grid = EdgeGrid(boxes)
+    grid.remove_obstacle(boxes[0])
+
+    edge_index, _, _ = grid.first_hits(np.array([[150.0, 110.0]]), np.array([[150.0, 210.0]]))
+
+    assert edge_index[0] == -1
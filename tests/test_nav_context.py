@@ -0,0 +1,35 @@
+import numpy as np
+import utils.pathfinding as pathfinding
+from utils.nav_context import NavContext
+
+TOP_LEFT = (100, 50)
+SPACING = 20
+
+
+def make_nav() -> NavContext:
+    """6 x 4 cell grid with cell (2, 1) blocked"""
+    grid = np.zeros((4, 6), dtype=np.int64)
+    grid[1, 2] = 1
+    nodes = [pathfinding.grid_to_pygame((x, y), TOP_LEFT, SPACING) for y in range(4) for x in range(6) if not grid[y, x]]
+    return NavContext(grid, nodes, TOP_LEFT, SPACING)
+
+
+def test_nodes_map_to_their_grid_cells():
+    nav = make_nav()
+
+    assert len(nav) == 23
+    for node_id, node in enumerate(nav.node_list):
+        cell = pathfinding.pygame_to_grid(node, TOP_LEFT, SPACING)
+        assert nav.node_at_cell(cell) == node_id
+    assert nav.node_at_cell((2, 1)) == -1      # Blocked
+    assert nav.node_at_cell((6, 0)) == -1      # Outside the grid
+
+
+def test_nearest_node_and_radius_query():
+    nav = make_nav()
+    pos = (nav.node_list[7][0] + 3, nav.node_list[7][1] - 4)
+
+    assert nav.nearest_node(pos) == 7
+    within = nav.nodes_within(nav.node_list[7], SPACING + 1)
+    expected = [i for i, node in enumerate(nav.node_list) if np.hypot(node[0] - nav.node_list[7][0], node[1] - nav.node_list[7][1]) <= SPACING + 1]
+    assert sorted(within) == expected
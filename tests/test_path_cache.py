@@ -0,0 +1,55 @@
+import numpy as np
+import utils.pathfinding as pathfinding
+from utils.nav_graph import NavGraph
+from utils.path_cache import PathCache
+
+
+def test_version_bump_drops_cached_paths():
+    grid = np.zeros((5, 7), dtype=np.int64)
+    graph = NavGraph(grid)
+    path = pathfinding.find_path(graph, (0, 2), (6, 2))
+    assert (3, 2) in path
+    assert pathfinding.find_path(graph, (0, 2), (6, 2)) == path
+    assert graph.path_cache.hits == 1
+
+    # Wall across the middle row, the straight path is no longer valid
+    blocked = grid.copy()
+    blocked[1:4, 3] = 1
+    assert graph.set_grid(blocked)
+    assert graph.version == 1
+
+    rerouted = pathfinding.find_path(graph, (0, 2), (6, 2))
+    assert all(not blocked[y, x] for x, y in rerouted)
+    assert len(graph.path_cache) == 1
+
+
+def test_unchanged_grid_keeps_cached_paths():
+    grid = np.zeros((5, 7), dtype=np.int64)
+    graph = NavGraph(grid)
+    pathfinding.find_path(graph, (0, 0), (6, 4))
+
+    assert not graph.set_grid(grid.copy())
+    assert graph.version == 0
+    assert len(graph.path_cache) == 1
+
+
+def test_suffix_of_a_cached_path_is_reused():
+    cache = PathCache()
+    cache.put((0, 0), (3, 0), 0, [(0, 0), (1, 0), (2, 0), (3, 0)])
+
+    assert cache.get((2, 0), (3, 0), 0) == ((2, 0), (3, 0))
+    assert cache.suffix_hits == 1
+    assert cache.get((2, 0), (3, 0), 1) is None    # Other version, cache emptied
+    assert len(cache) == 0
+
+
+def test_least_recently_used_path_is_evicted():
+    cache = PathCache(max_size=2)
+    cache.put((0, 0), (1, 0), 0, [(0, 0), (1, 0)])
+    cache.put((0, 1), (1, 1), 0, [(0, 1), (1, 1)])
+    cache.get((0, 0), (1, 0), 0)                    # Now the most recently used
+    cache.put((0, 2), (1, 2), 0, [(0, 2), (1, 2)])
+
+    assert cache.get((0, 1), (1, 1), 0) is None
+    assert cache.get((0, 0), (1, 0), 0) is not None
+    assert cache.get((1, 1), (1, 1), 0) is None     # Suffix entries of the evicted path are gone too
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from object_classes.projectile import ProjectilePool, SPAWN_TIMER
+from utils.spatial_index import EdgeGrid
+
+
+class SilentSound:
+    def play(self):
+        pass
+
+
+@pytest.fixture
+def pool():
+    pool = ProjectilePool(capacity=4)
+    pool.init_sound_effects({"wallhit": [SilentSound()], "proj_explosion": [SilentSound()]})
+    return pool
+
+
+def spawn(pool: ProjectilePool, pos=(500.0, 500.0), direction=(1.0, 0.0), speed=3.0, bounce_limit=2, owner=1):
+    return pool.spawn(list(pos), list(pos), direction, speed, bounce_limit, owner, 1 / 60)
+
+
+def test_released_slots_are_reused_lowest_first(pool):
+    views = [spawn(pool) for _ in range(3)]
+    assert [view.index for view in views] == [0, 1, 2]
+
+    pool.alive[[0, 2]] = False
+    released = pool.release_dead()
+
+    assert len(released) == 2
+    assert pool.count_owned(1) == 1
+    assert spawn(pool).index == 0
+    assert spawn(pool).index == 2
+    assert spawn(pool).index == 3
+
+
+def test_dead_slots_stay_active_until_released(pool):
+    view = spawn(pool, pos=(10.0, 20.0))
+    pool.alive[view.index] = False
+
+    assert [v.index for v in pool.active_views()] == [view.index]
+    assert spawn(pool).index != view.index     # Not reusable before release_dead
+    assert np.allclose(pool.release_dead(), [(10.0, 20.0)])
+    assert pool.release_dead().shape == (0, 2)
+
+
+def test_pool_grows_and_keeps_views(pool):
+    views = [spawn(pool) for _ in range(9)]
+
+    assert pool.capacity == 16
+    assert [view.index for view in views] == list(range(9))
+    assert all(pool.views[view.index] is view for view in views)
+
+
+def test_fast_projectile_bounces_instead_of_tunnelling(pool, boxes):
+    wall_index = EdgeGrid(boxes)
+    # 60 px per tick toward the left side of box 1 (x = 400), 70 px away
+    view = spawn(pool, pos=(330.0, 450.0), speed=60.0)
+    pool.spawn_timer[view.index] = SPAWN_TIMER - 1   # Not fresh, only the sweep runs
+
+    pool.update(1 / 60, wall_index)
+    pool.update(1 / 60, wall_index)
+
+    assert view.bounce_count == 1
+    assert view.direction[0] < 0
+    assert view.pos[0] < 400
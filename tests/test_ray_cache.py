@@ -0,0 +1,37 @@
+from utils.ray_cache import RayCache
+
+
+def test_least_recently_used_path_is_evicted():
+    cache = RayCache(max_size=2)
+    keys = [cache.key((100.0 * i, 50.0), 10.0 * i, 1, 0) for i in range(3)]
+    cache.put(keys[0], ["a"])
+    cache.put(keys[1], ["b"])
+    assert cache.get(keys[0]) == ["a"]      # keys[1] is now the least recently used
+
+    cache.put(keys[2], ["c"])
+
+    assert len(cache) == 2
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == ["a"]
+    assert cache.get(keys[2]) == ["c"]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_keys_are_quantized():
+    cache = RayCache(pos_step=2.0, angle_step=0.25)
+
+    assert cache.key((100.4, 50.6), 10.1, 2, 0) == cache.key((99.6, 50.0), 10.0, 2, 0)
+    assert cache.key((100.0, 50.0), 359.99, 2, 0) == cache.key((100.0, 50.0), 0.0, 2, 0)
+    assert cache.key((100.0, 50.0), 10.0, 2, 0) != cache.key((100.0, 50.0), 10.0, 2, 1)   # Wall set version
+    assert cache.key((100.0, 50.0), 10.0, 2, 0) != cache.key((100.0, 50.0), 10.0, 3, 0)   # Bounces
+
+
+def test_invalidate_drops_all_paths():
+    cache = RayCache()
+    key = cache.key((0.0, 0.0), 0.0, 1, 0)
+    cache.put(key, ["a"])
+
+    cache.invalidate()
+
+    assert len(cache) == 0
+    assert cache.get(key) is None